@@ -1,5 +1,29 @@
+import heapq
 import math
-from typing import List, Dict
+import string
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Tuple
+
+# Per-stage spans, active only when RAG_TRACE=1 (see 08_Production_Challenges/tracing.py).
+# tracing.py is standard library only; if it is not there, the spans do nothing.
+sys.path.append(str(Path(__file__).resolve().parent.parent / "08_Production_Challenges"))
+try:
+    from tracing import span
+except ImportError:
+    class _NoopSpan:
+        def set(self, **attributes):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc, tb):
+            return False
+
+    def span(name, **attributes):
+        return _NoopSpan()
 
 # 1. Knowledge Base (The "Retrieval" Source)
 # In a real app, this would be a Vector Database (Chroma, Pinecone, etc.)
@@ -13,36 +37,77 @@ knowledge_base = [
     {"id": 6, "content": "Vector embeddings are often used to measure similarity between query and documents."}
 ]
 
-# 2. Simple Similarity Function (The "Retriever" Logic)
+# 2. Keyword Index (The "Retriever" Logic)
 # In a real app, this would use Cosine Similarity on Vector Embeddings.
-# Here we use a naive keyword matching approach for simplicity.
-def retrieve_documents(query: str, top_k: int = 2) -> List[Dict]:
-    print(f"\n--- Retrieving relevant info for: '{query}' ---")
-    
-    # Simple scoring: count how many words from query appear in the content
-    scored_docs = []
-    import string
-    
-    def normalize_tokens(text: str) -> set:
-        # Standardize matching: lower case, remove punctuation
-        text = text.lower().translate(str.maketrans('', '', string.punctuation))
-        return set(text.split())
+# Here we use a keyword inverted index: every document is tokenized ONCE at load time
+# and each term points to the documents that contain it (its "posting list").
+# A query only touches the posting lists of its own terms, never the whole corpus.
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
 
-    query_words = normalize_tokens(query)
-    
-    for doc in knowledge_base:
-        doc_words = normalize_tokens(doc["content"])
-        # Jaccard similarity-ish (intersection count)
-        score = len(query_words.intersection(doc_words))
-        scored_docs.append((doc, score))
-    
-    # Sort by score (descending) and take top_k
-    scored_docs.sort(key=lambda x: x[1], reverse=True)
-    
-    # Filter out 0 scores (irrelevant)
-    relevant_docs = [doc for doc, score in scored_docs if score > 0]
+def normalize_tokens(text: str) -> List[str]:
+    # Standardize matching: lower case, remove punctuation
+    return text.lower().translate(_PUNCTUATION_TABLE).split()
+
+class BM25Retriever:
+    """
+    Inverted index over a list of {"id", "content"} documents.
+
+    mode="bm25" ranks with Okapi BM25 (term frequency, rarity and document length).
+    mode="intersection" keeps the original scoring: how many distinct query words
+    appear in the document.
+    """
+
+    def __init__(self, docs: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}  # term -> [(doc_index, term_frequency)]
+        self.doc_lengths: List[int] = []
+
+        for doc_index, doc in enumerate(docs):
+            tokens = normalize_tokens(doc["content"])
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc_index, tf))
+
+        self.avg_doc_length = sum(self.doc_lengths) / len(docs) if docs else 0.0
+        # IDF is fixed once the corpus is loaded, so compute it once per term
+        n_docs = len(docs)
+        self.idf = {
+            term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def score(self, query: str, mode: str = "bm25") -> Dict[int, float]:
+        # Accumulate scores only for documents that appear in the query terms' postings
+        scores: Dict[int, float] = {}
+        for term in set(normalize_tokens(query)):
+            for doc_index, tf in self.postings.get(term, ()):
+                if mode == "intersection":
+                    contribution = 1.0
+                elif mode == "bm25":
+                    length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / self.avg_doc_length
+                    contribution = self.idf[term] * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+                else:
+                    raise ValueError(f"Unknown scoring mode: {mode}")
+                scores[doc_index] = scores.get(doc_index, 0.0) + contribution
+        return scores
+
+    def search(self, query: str, top_k: int = 2, mode: str = "bm25") -> List[Tuple[Dict, float]]:
+        scores = self.score(query, mode=mode)
+        # Heap selection of the top_k instead of sorting every match.
+        # Ties are broken by corpus order, like the original stable sort.
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.docs[doc_index], score) for doc_index, score in best]
+
+# Built once when the module loads, reused by every query
+retriever = BM25Retriever(knowledge_base)
+
+def retrieve_documents(query: str, top_k: int = 2, mode: str = "bm25") -> List[Dict]:
+    print(f"\n--- Retrieving relevant info for: '{query}' ---")
     
-    return relevant_docs[:top_k]
+    # Documents without any query word never get a score, so there are no 0 scores to filter
+    return [doc for doc, score in retriever.search(query, top_k=top_k, mode=mode)]
 
 # 3. Simple Generator (The "Generation" Logic)
 # In a real app, this would be an LLM call (e.g., OpenAI GPT-4, Llama 3).
@@ -74,12 +139,16 @@ def generate_answer(query: str, context_docs: List[Dict]) -> str:
 
 # 4. Main RAG Pipeline
 def run_rag_pipeline(query: str):
-    # Step 1: Retrieve
-    retrieved_docs = retrieve_documents(query, top_k=2)
-    print(f"Retrieved {len(retrieved_docs)} documents.")
-    
-    # Step 2: Generate
-    answer = generate_answer(query, retrieved_docs)
+    with span("request", pipeline="simple_rag"):
+        # Step 1: Retrieve
+        with span("retrieve") as s:
+            retrieved_docs = retrieve_documents(query, top_k=2)
+            s.set(candidates=len(retrieved_docs))
+        print(f"Retrieved {len(retrieved_docs)} documents.")
+        
+        # Step 2: Generate
+        with span("generate", context_docs=len(retrieved_docs)):
+            answer = generate_answer(query, retrieved_docs)
     
     print(f"\n[Final Answer]: {answer}\n")
 
@@ -0,0 +1,252 @@
+"""
+Streaming bulk ingestion for large PDF corpora.
+
+`ingestion.py` adds one hardcoded list in a single call. For thousands of PDFs
+that would mean holding every page, chunk and vector in memory at once. Here
+ingestion is a pipeline of stages connected by BOUNDED queues:
+
+    loader -> [process pool: parse + chunk] -> embedder -> batched writer
+
+- loader:   walks the corpus and yields small tasks (a file + a page range).
+- parse:    pypdf text extraction and chunking run in a process pool (CPU bound).
+- embedder: embeds chunks in batches (through the persistent embedding cache).
+- writer:   upserts to Chroma in batches of `write_batch_size`.
+
+When a later stage is slow, the queue in front of it fills up and the earlier
+stages block, so memory stays flat no matter how big the corpus is.
+
+Usage:
+    python bulk_ingestion.py path/to/pdf_folder --workers 4 --write-batch-size 256
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader
+from delta_ingestion import chunk_id
+from span_chunker import SpanChunker
+
+_DONE = object()  # End-of-stream marker passed down the queues
+
+
+class _Aborted(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+# 1. Loader: one task per (file, page range). Only page counts are read here.
+def iter_tasks(root, pages_per_task):
+    paths = [root] if os.path.isfile(root) else sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(root)
+        for name in names
+        if name.lower().endswith(".pdf")
+    )
+    for path in paths:
+        n_pages = len(PdfReader(path).pages)
+        for start in range(0, n_pages, pages_per_task):
+            yield path, start, min(start + pages_per_task, n_pages), n_pages
+
+
+# 2. Parse + chunk. Runs inside worker processes, so it must be a top-level function.
+def parse_and_chunk(task, chunk_size, chunk_overlap):
+    path, start, end, n_pages = task
+    reader = PdfReader(path)
+    chunker = SpanChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    chunks = []
+    for page_no in range(start, end):
+        text = reader.pages[page_no].extract_text() or ""
+        source = f"{path}#page={page_no + 1}"
+        for i, chunk in enumerate(chunker.iter_chunks(text)):
+            chunks.append((
+                chunk_id(source, chunk, i),
+                chunk,
+                {"source": path, "page": page_no + 1},
+            ))
+    return path, end == n_pages, end - start, chunks
+
+
+class BulkIngestionPipeline:
+    def __init__(self, collection, embed_fn, workers=4, chunk_size=1000, chunk_overlap=100,
+                 pages_per_task=8, embed_batch_size=64, write_batch_size=256, queue_size=1024,
+                 report_every=5.0):
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.pages_per_task = pages_per_task
+        self.embed_batch_size = embed_batch_size
+        self.write_batch_size = write_batch_size
+        self.report_every = report_every
+
+        # Bounded queues are what keep memory flat: producers block when they are full
+        self.chunk_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=max(1, queue_size // embed_batch_size))
+
+        self.counters = {"docs": 0, "pages": 0, "chunks_parsed": 0, "chunks_embedded": 0, "chunks_written": 0}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._failed = threading.Event()
+        self.errors = []
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, n in increments.items():
+                self.counters[name] += n
+
+    # Queue helpers that give up once any stage has failed, instead of blocking forever
+    def _put(self, q, item):
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._failed.is_set():
+                    raise _Aborted()
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._failed.is_set():
+                    raise _Aborted()
+
+    # --- Stages ---
+    def _parse_stage(self, root):
+        # At most 2 tasks per worker in flight; results are consumed in submission order
+        max_in_flight = self.workers * 2
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = deque()
+            for task in iter_tasks(root, self.pages_per_task):
+                in_flight.append(pool.submit(parse_and_chunk, task, self.chunk_size, self.chunk_overlap))
+                if len(in_flight) >= max_in_flight:
+                    self._emit(in_flight.popleft().result())
+            while in_flight:
+                self._emit(in_flight.popleft().result())
+
+    def _emit(self, result):
+        path, file_done, n_pages, chunks = result
+        for chunk in chunks:
+            self._put(self.chunk_queue, chunk)  # Blocks while the embedder is behind
+        self._count(pages=n_pages, chunks_parsed=len(chunks), docs=int(file_done))
+
+    def _embed_stage(self):
+        batch = []
+        while True:
+            item = self._get(self.chunk_queue)
+            if item is not _DONE:
+                batch.append(item)
+            if batch and (len(batch) >= self.embed_batch_size or item is _DONE):
+                ids, docs, metas = zip(*batch)
+                embeddings = self.embed_fn(list(docs))
+                self._put(self.write_queue, (list(ids), list(docs), list(metas), [list(map(float, v)) for v in embeddings]))
+                self._count(chunks_embedded=len(batch))
+                batch = []
+            if item is _DONE:
+                self._put(self.write_queue, _DONE)
+                return
+
+    def _write_stage(self):
+        pending = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        while True:
+            item = self._get(self.write_queue)
+            if item is not _DONE:
+                for key, values in zip(("ids", "documents", "metadatas", "embeddings"), item):
+                    pending[key].extend(values)
+            if pending["ids"] and (len(pending["ids"]) >= self.write_batch_size or item is _DONE):
+                self.collection.upsert(**pending)
+                self._count(chunks_written=len(pending["ids"]))
+                pending = {key: [] for key in pending}
+            if item is _DONE:
+                return
+
+    def _report_stage(self, started):
+        while not self._finished.wait(self.report_every):
+            self.print_report(started)
+
+    def print_report(self, started):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        with self._lock:
+            c = dict(self.counters)
+        print(
+            f"[{elapsed:7.1f}s] docs {c['docs']} ({c['docs'] / elapsed:.2f}/s) | "
+            f"pages {c['pages']} ({c['pages'] / elapsed:.1f}/s) | "
+            f"chunks parsed {c['chunks_parsed']} ({c['chunks_parsed'] / elapsed:.1f}/s), "
+            f"embedded {c['chunks_embedded']} ({c['chunks_embedded'] / elapsed:.1f}/s), "
+            f"written {c['chunks_written']} ({c['chunks_written'] / elapsed:.1f}/s) | "
+            f"queue depth: chunks {self.chunk_queue.qsize()}, write batches {self.write_queue.qsize()}"
+        )
+
+    def _guard(self, stage, *args):
+        try:
+            stage(*args)
+        except _Aborted:
+            pass
+        except Exception as e:
+            self.errors.append(e)
+            self._failed.set()
+
+    def run(self, root):
+        started = time.monotonic()
+        embedder = threading.Thread(target=self._guard, args=(self._embed_stage,), name="embedder")
+        writer = threading.Thread(target=self._guard, args=(self._write_stage,), name="writer")
+        reporter = threading.Thread(target=self._report_stage, args=(started,), name="reporter", daemon=True)
+        for thread in (embedder, writer, reporter):
+            thread.start()
+
+        self._guard(self._parse_stage, root)
+        self._guard(self._put, self.chunk_queue, _DONE)
+        embedder.join()
+        writer.join()
+        self._finished.set()
+
+        self.print_report(started)
+        if self.errors:
+            raise self.errors[0]
+        return dict(self.counters)
+
+
+if __name__ == "__main__":
+    import chromadb
+    from chromadb.utils import embedding_functions
+    from embedding_cache import EmbeddingCache
+
+    parser = argparse.ArgumentParser(description="Stream a folder of PDFs into ChromaDB")
+    parser.add_argument("path", help="PDF file or folder (searched recursively)")
+    parser.add_argument("--collection", default="bulk_collection")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    parser.add_argument("--write-batch-size", type=int, default=256)
+    parser.add_argument("--queue-size", type=int, default=1024)
+    parser.add_argument("--report-every", type=float, default=5.0)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path="./chroma_db_data")
+    default_ef = embedding_functions.DefaultEmbeddingFunction()
+    collection = client.get_or_create_collection(
+        name=args.collection, embedding_function=default_ef, metadata={"hnsw:space": "cosine"}
+    )
+    embedding_cache = EmbeddingCache("./embedding_cache", model_name="all-MiniLM-L6-v2")
+
+    pipeline = BulkIngestionPipeline(
+        collection,
+        embed_fn=lambda texts: embedding_cache.embed(texts, default_ef),
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        embed_batch_size=args.embed_batch_size,
+        write_batch_size=args.write_batch_size,
+        queue_size=args.queue_size,
+        report_every=args.report_every,
+    )
+    totals = pipeline.run(args.path)
+    print(f"Done: {totals}. Collection count: {collection.count()}")
@@ -1,4 +1,5 @@
 from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
+from span_chunker import SpanChunker
 
 # 1. Sample Text (A generic technical explanation)
 cleaned_text = """
@@ -47,6 +48,25 @@ recursive_splitter = RecursiveCharacterTextSplitter(
 recursive_chunks = recursive_splitter.split_text(cleaned_text)
 print_chunks(recursive_chunks, "Recursive (100 chars, 20 overlap)")
 
-# 4. Comparing the results
+# 4. Offset-based Chunking (Same rules, no copies)
+# The langchain splitters return a new string for every chunk (overlap included).
+# SpanChunker applies the same recursive rules but returns (start, end) offsets into the
+# source, so nothing is copied until a consumer actually slices a chunk.
+print("\n=== STRATEGY 3: Offset-based Recursive Chunking ===")
+span_chunker = SpanChunker(
+    chunk_size=100,
+    chunk_overlap=20,
+    separators=["\n\n", "\n", " ", ""]
+)
+spans = list(span_chunker.split_spans(cleaned_text))
+print(f"First spans: {spans[:3]}")
+print(f"Same chunks as the recursive splitter: {list(span_chunker.iter_chunks(cleaned_text)) == recursive_chunks}")
+
+# Very large inputs can be streamed in blocks (e.g. a file read 1MB at a time):
+#   with open("big.txt") as f:
+#       for start, end in span_chunker.split_stream(iter(lambda: f.read(1 << 20), "")):
+#           ...
+
+# 5. Comparing the results
 # Notice how the Recursive splitter tries to avoid breaking sentences mid-way if possible,
 # whereas the Fixed splitter just cuts off at the character limit.
@@ -0,0 +1,159 @@
+"""
+Delta (upsert) ingestion: only touch the chunks that actually changed.
+
+Dropping and recreating a collection on every run re-embeds and re-writes
+everything, and random uuid4 ids mean the same chunk never keeps its identity.
+Here every chunk gets a deterministic id derived from its source and content,
+and a manifest on disk remembers which chunk ids each source produced last time.
+Re-ingesting a source computes a diff against the manifest and issues only the
+needed `upsert` / `delete` calls.
+
+Manifest format (JSON):
+    {"collection": "<name>", "sources": {"<source>": {"<chunk_id>": "<metadata_hash>"}}}
+
+Derived metadata (e.g. PII verdicts) is computed inside the upsert path by an
+optional `annotate_fn(texts) -> [metadata, ...]`, so every chunk that gets
+written carries it and a re-ingested chunk can never lose it. Its `version`
+attribute is part of the manifest hash: a new version re-upserts (and
+re-annotates) every chunk on the next sync.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from embedding_cache import normalize_text
+
+
+def chunk_id(source, text, occurrence=0):
+    """
+    Stable id for a chunk: same source + same content -> same id on every run.
+    `occurrence` separates identical chunks that appear more than once in a source.
+    """
+    key = f"{source}\0{normalize_text(text)}\0{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def metadata_hash(metadata, annotation_version=None):
+    key = [metadata or {}, annotation_version] if annotation_version else metadata or {}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_pii_scanner():
+    """
+    annotate_fn writing PII verdicts (04_Privacy_and_Redaction/pii_verdicts.py),
+    or None when Presidio is not installed: chunks are then written without
+    verdicts and safe_retrieval scans them at query time instead.
+    """
+    sys.path.append(str(Path(__file__).resolve().parent.parent / "04_Privacy_and_Redaction"))
+    try:
+        from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine
+        from pii_verdicts import VerdictScanner
+    except ImportError:
+        print("Presidio not installed: ingesting without PII verdicts")
+        return None
+    return VerdictScanner(BatchAnalyzerEngine(analyzer_engine=AnalyzerEngine()))
+
+
+class DeltaIngestor:
+    def __init__(self, collection, manifest_path, annotate_fn=None):
+        self.collection = collection
+        self.manifest_path = manifest_path
+        self.annotate_fn = annotate_fn
+        self.annotation_version = getattr(annotate_fn, "version", None)
+        self.manifest = {"collection": collection.name, "sources": {}}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+
+    @classmethod
+    def open(cls, client, name, manifest_path, rebuild=False, annotate_fn=None, **collection_kwargs):
+        """
+        Gets (or creates) the collection and its manifest.
+
+        The collection is rebuilt from scratch when asked to, or when there is no
+        manifest: chunks written without one (e.g. with uuid ids) could never be diffed.
+        """
+        existing = [c if isinstance(c, str) else c.name for c in client.list_collections()]
+        if rebuild or not os.path.exists(manifest_path) or name not in existing:
+            if name in existing:
+                client.delete_collection(name=name)
+                print(f"Deleted existing collection: {name}")
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+        collection = client.get_or_create_collection(name=name, **collection_kwargs)
+        return cls(collection, manifest_path, annotate_fn=annotate_fn)
+
+    def chunk_ids(self, source, documents):
+        seen = {}
+        ids = []
+        for text in documents:
+            key = normalize_text(text)
+            ids.append(chunk_id(source, text, seen.get(key, 0)))
+            seen[key] = seen.get(key, 0) + 1
+        return ids
+
+    def diff(self, source, documents, metadatas=None):
+        """
+        Returns (ids, upsert_positions, delete_ids, n_unchanged) for a new version of `source`.
+        """
+        metadatas = metadatas or [{} for _ in documents]
+        ids = self.chunk_ids(source, documents)
+        previous = self.manifest["sources"].get(source, {})
+
+        upsert_positions = [
+            i for i, (cid, metadata) in enumerate(zip(ids, metadatas))
+            if previous.get(cid) != metadata_hash(metadata, self.annotation_version)
+        ]
+        delete_ids = sorted(set(previous) - set(ids))
+        n_unchanged = len(ids) - len(upsert_positions)
+        return ids, upsert_positions, delete_ids, n_unchanged
+
+    def sync_source(self, source, documents, metadatas=None, embed_fn=None):
+        """
+        Brings `source` in the collection up to date with `documents`.
+        embed_fn(texts) is only called for the chunks being upserted; without it,
+        the collection's own embedding function is used. annotate_fn, if set, runs on
+        the same chunks and its metadata is merged into theirs before the upsert.
+        """
+        metadatas = metadatas or [{} for _ in documents]
+        ids, upsert_positions, delete_ids, n_unchanged = self.diff(source, documents, metadatas)
+
+        if upsert_positions:
+            batch = {
+                "ids": [ids[i] for i in upsert_positions],
+                "documents": [documents[i] for i in upsert_positions],
+            }
+            batch_metadatas = [metadatas[i] for i in upsert_positions]
+            if self.annotate_fn is not None:
+                annotations = self.annotate_fn(batch["documents"])
+                batch_metadatas = [{**(m or {}), **a} for m, a in zip(batch_metadatas, annotations)]
+            # Always sent, even when empty: an upsert without metadatas would keep the old ones
+            batch["metadatas"] = batch_metadatas
+            if embed_fn is not None:
+                batch["embeddings"] = [list(map(float, v)) for v in embed_fn(batch["documents"])]
+            self.collection.upsert(**batch)
+        if delete_ids:
+            self.collection.delete(ids=delete_ids)
+
+        self.manifest["sources"][source] = {
+            cid: metadata_hash(m, self.annotation_version) for cid, m in zip(ids, metadatas)
+        }
+        self.save()
+        return {"upserted": len(upsert_positions), "deleted": len(delete_ids), "unchanged": n_unchanged}
+
+    def remove_source(self, source):
+        previous = self.manifest["sources"].pop(source, {})
+        if previous:
+            self.collection.delete(ids=list(previous))
+        self.save()
+        return {"upserted": 0, "deleted": len(previous), "unchanged": 0}
+
+    def save(self):
+        # Write-then-rename so a crash never leaves a truncated manifest behind
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
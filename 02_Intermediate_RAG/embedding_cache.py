@@ -0,0 +1,113 @@
+"""
+Persistent embedding cache keyed by (model name, normalized text hash).
+
+Re-running ingestion, trying a new chunking strategy or rebuilding a collection
+usually re-embeds text that has been embedded before. This cache stores every
+vector once, so only text that has never been seen goes through the model.
+
+On-disk layout (one directory per model, because each model has its own dimension):
+    <cache_dir>/<model_name>/vectors.f32   raw float32 rows, appended, read via np.memmap
+    <cache_dir>/<model_name>/index.tsv     "<text_hash>\t<row>" lines, appended
+    <cache_dir>/<model_name>/meta.json     model name and vector dimension
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    # Unicode and whitespace differences should not cause a cache miss
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir, model_name):
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, model_name.replace("/", "__"))
+        os.makedirs(self.path, exist_ok=True)
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.index_path = os.path.join(self.path, "index.tsv")
+        self.meta_path = os.path.join(self.path, "meta.json")
+
+        self.rows = {}  # text_hash -> row
+        self.dim = None
+        self.n_rows = 0  # Rows physically present in vectors.f32
+        self._matrix = None
+        self.stats = {"hits": 0, "misses": 0}
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+            # Drop a trailing row that a crash left half-written
+            row_bytes = self.dim * 4
+            size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+            self.n_rows = size // row_bytes
+            if size != self.n_rows * row_bytes:
+                with open(self.vectors_path, "r+b") as f:
+                    f.truncate(self.n_rows * row_bytes)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    key, row = line.rstrip("\n").split("\t")
+                    if int(row) < self.n_rows:
+                        self.rows[key] = int(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def matrix(self):
+        # Memory-mapped view of all cached vectors; re-opened only after new rows were written
+        if self._matrix is None or self._matrix.shape[0] != self.n_rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.n_rows, self.dim))
+        return self._matrix
+
+    def embed(self, texts, embed_fn):
+        """
+        Returns a (len(texts), dim) float32 array. embed_fn(list_of_texts) is only
+        called for texts the cache has never seen, once per distinct text.
+        """
+        keys = [text_hash(text) for text in texts]
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.rows and key not in missing:
+                missing[key] = text
+        self.stats["misses"] += len(missing)
+        self.stats["hits"] += len(texts) - len(missing)
+
+        if missing:
+            new_vectors = np.asarray(embed_fn(list(missing.values())), dtype=np.float32)
+            self._append(list(missing.keys()), new_vectors)
+
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self.matrix()[[self.rows[key] for key in keys]])
+
+    def _append(self, keys, vectors):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Cache for {self.model_name} holds {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+        # Vectors first, index second: an interrupted write never points at missing data
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors).tobytes())
+        start = self.n_rows
+        self.n_rows += len(keys)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            for offset, key in enumerate(keys):
+                f.write(f"{key}\t{start + offset}\n")
+                self.rows[key] = start + offset
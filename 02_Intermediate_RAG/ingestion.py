@@ -1,6 +1,9 @@
 import chromadb
 from chromadb.utils import embedding_functions
+import argparse
 import os
+from embedding_cache import EmbeddingCache
+from delta_ingestion import DeltaIngestor, load_pii_scanner
 
 # 1. Setup ChromaDB client
 # This creates a persistent database on disk in the 'chroma_db_data' folder
@@ -11,20 +14,31 @@ client = chromadb.PersistentClient(path="./chroma_db_data")
 # In production, you might use OpenAIEmbeddingFunction or similar.
 default_ef = embedding_functions.DefaultEmbeddingFunction()
 
+# Persistent embedding cache: text that was embedded on a previous run is read back
+# from disk instead of going through the model again.
+embedding_cache = EmbeddingCache("./embedding_cache", model_name="all-MiniLM-L6-v2")
+
 # 3. Create or Get a Collection
 # A collection is like a table in SQL.
+# Instead of deleting it on every run, we keep it and only apply what changed (delta ingestion).
+# Pass --rebuild to drop it and start over.
+# Every chunk that gets upserted is also scanned for PII once, and the verdict is
+# stored in its metadata (see 04_Privacy_and_Redaction/pii_verdicts.py).
+parser = argparse.ArgumentParser()
+parser.add_argument("--rebuild", action="store_true", help="Drop the collection and re-ingest everything")
+args = parser.parse_args()
+
 collection_name = "demo_collection"
-try:
-    client.delete_collection(name=collection_name) # Cleanup for fresh run
-    print(f"Deleted existing collection: {collection_name}")
-except:
-    pass
-
-collection = client.create_collection(
-    name=collection_name,
+ingestor = DeltaIngestor.open(
+    client,
+    collection_name,
+    manifest_path=f"./chroma_db_data/{collection_name}_manifest.json",
+    rebuild=args.rebuild,
+    annotate_fn=load_pii_scanner(),
     embedding_function=default_ef,
     metadata={"hnsw:space": "cosine"} # Similarity metric
 )
+collection = ingestor.collection
 
 # 4. Mock Data Ingestion
 # In a real app, this would come from PDF loaders (pypdf) or web scrapers.
@@ -44,13 +58,26 @@ metadatas = [
     {"source": "paper_2017", "category": "AI"}
 ]
 
-ids = [f"doc_{i}" for i in range(len(documents))]
+# 5. Sync each source
+# Chunk ids are derived from (source, content), so unchanged documents are skipped,
+# edited ones are upserted and removed ones are deleted.
+def embed(texts):
+    return embedding_cache.embed(texts, default_ef)
 
-print(f"Adding {len(documents)} documents to the vector store...")
-collection.add(
-    documents=documents,
-    metadatas=metadatas,
-    ids=ids
-)
+print(f"Syncing {len(documents)} documents to the vector store...")
+by_source = {}
+for doc, meta in zip(documents, metadatas):
+    by_source.setdefault(meta["source"], ([], []))
+    by_source[meta["source"]][0].append(doc)
+    by_source[meta["source"]][1].append(meta)
+
+for source, (source_docs, source_metas) in by_source.items():
+    stats = ingestor.sync_source(source, source_docs, source_metas, embed_fn=embed)
+    print(f"  {source}: {stats}")
+
+# Sources that are no longer in the input lose all their chunks
+for source in set(ingestor.manifest["sources"]) - set(by_source):
+    print(f"  {source}: {ingestor.remove_source(source)}")
 
+print(f"Embedding cache: {embedding_cache.stats['hits']} hits, {embedding_cache.stats['misses']} newly embedded")
 print(f"Ingestion complete. Collection count: {collection.count()}")
@@ -0,0 +1,183 @@
+"""
+IVF (inverted file) approximate nearest-neighbour index with tunable recall.
+
+Chroma's HNSW index is a black box: there is no knob to trade recall for
+latency per query. IVF makes that trade-off explicit:
+
+1. Build: k-means splits the vectors into `n_lists` partitions ("lists").
+   Vectors are stored sorted by list, so every list is one contiguous block.
+2. Query: score the query against the list centroids, open only the `nprobe`
+   closest lists and search those exactly.
+
+nprobe=1 is fastest, nprobe=n_lists is exact search. Everything is saved as
+.npy files and memory-mapped on load, so the index can sit next to a
+collection on disk and only the probed lists are paged in.
+
+Benchmark recall@k and QPS against exact search:
+    python ivf_index.py                                  # synthetic data
+    python ivf_index.py --store ./flat_store/demo_collection --nprobe 1 2 4 8
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+from quantization import assign_clusters, kmeans, recall_at_k, synthetic_vectors
+from vector_stores import normalize_rows, top_k_rows
+
+_FILES = ("centroids", "list_offsets", "row_ids", "vectors")
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_offsets, row_ids, vectors):
+        self.centroids = centroids          # (n_lists, dim)
+        self.list_offsets = list_offsets    # (n_lists + 1,) list i is rows [offsets[i], offsets[i+1])
+        self.row_ids = row_ids              # (n,) original row number of each stored vector
+        self.vectors = vectors              # (n, dim) normalized, sorted by list
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_iter=20, sample_size=100_000, seed=0, path=None, block_size=65_536):
+        """
+        Normalization, list assignment and the reordering by list all run in blocks
+        of `block_size` rows, so building never holds a second copy of the matrix.
+        With `path`, the sorted vectors are written straight into a memory-mapped
+        <path>/vectors.npy and the saved index is returned memory-mapped.
+        """
+        vectors = vectors if isinstance(vectors, np.ndarray) else np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        n_lists = n_lists or max(1, int(4 * math.sqrt(n)))
+
+        # Train the coarse quantizer on a sample, then assign every vector
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if n > sample_size:
+            sample = vectors[np.sort(rng.choice(n, size=sample_size, replace=False))]
+        centroids, _ = kmeans(normalize_rows(sample), n_lists, n_iter=n_iter, seed=seed)
+        assignments = np.empty(n, dtype=np.int64)
+        for start in range(0, n, block_size):
+            assignments[start:start + block_size] = assign_clusters(normalize_rows(vectors[start:start + block_size]), centroids)
+
+        order = np.argsort(assignments, kind="stable")
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=list_offsets[1:])
+        del assignments
+
+        # Gather each output block from its source rows (ascending within a list)
+        if path:
+            os.makedirs(path, exist_ok=True)
+            sorted_vectors = np.lib.format.open_memmap(
+                os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float32, shape=(n, dim)
+            )
+        else:
+            sorted_vectors = np.empty((n, dim), dtype=np.float32)
+        for start in range(0, n, block_size):
+            rows = order[start:start + block_size]
+            sorted_vectors[start:start + len(rows)] = normalize_rows(vectors[rows])
+
+        index = cls(centroids, list_offsets, order.astype(np.int64), sorted_vectors)
+        if path:
+            index.save(path)
+            return cls.load(path)
+        return index
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in _FILES:
+            target = os.path.join(path, f"{name}.npy")
+            array = getattr(self, name)
+            if isinstance(array, np.memmap) and os.path.abspath(array.filename) == os.path.abspath(target):
+                array.flush()  # Built in place (build(path=...)): already on disk
+                continue
+            np.save(target, array)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mode = "r" if mmap else None
+        return cls(*(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in _FILES))
+
+    def search(self, queries, k=10, nprobe=8):
+        """
+        Returns (row_ids, similarities), both (n_queries x k); -1 / -inf where fewer than k were found.
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        nprobe = min(nprobe, self.n_lists)
+        probes = top_k_rows(queries @ self.centroids.T, nprobe)
+
+        found = np.full((len(queries), k), -1, dtype=np.int64)
+        sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probes):
+            ranges = [(self.list_offsets[i], self.list_offsets[i + 1]) for i in np.sort(lists)]
+            ranges = [(a, b) for a, b in ranges if b > a]
+            if not ranges:
+                continue
+            positions = np.concatenate([np.arange(a, b) for a, b in ranges])
+            candidate_sims = np.concatenate([np.asarray(self.vectors[a:b]) @ queries[q] for a, b in ranges])
+            best = top_k_rows(candidate_sims[None, :], k)[0]
+            found[q, :len(best)] = self.row_ids[positions[best]]
+            sims[q, :len(best)] = candidate_sims[best]
+        return found, sims
+
+
+def benchmark(index, vectors, queries, k=10, nprobes=(1, 2, 4, 8, 16, 32)):
+    """
+    recall@k (vs exact search) and queries per second for each nprobe.
+    """
+    vectors = normalize_rows(vectors)
+    queries = normalize_rows(queries)
+
+    started = time.perf_counter()
+    truth = np.stack([top_k_rows((vectors @ q)[None, :], k)[0] for q in queries])  # One query at a time, like IVF
+    exact_qps = len(queries) / (time.perf_counter() - started)
+
+    print(f"{len(vectors)} vectors, {index.n_lists} lists, {len(queries)} queries, recall@{k}")
+    print(f"{'nprobe':>8} {'recall':>8} {'QPS':>10} {'speedup':>8}")
+    print(f"{'exact':>8} {1.0:>8.3f} {exact_qps:>10.1f} {1.0:>7.1f}x")
+    report = [{"nprobe": "exact", "recall": 1.0, "qps": exact_qps}]
+    for nprobe in nprobes:
+        if nprobe > index.n_lists:
+            break
+        started = time.perf_counter()
+        found, _ = index.search(queries, k=k, nprobe=nprobe)
+        qps = len(queries) / (time.perf_counter() - started)
+        recall = recall_at_k(found, truth)
+        report.append({"nprobe": nprobe, "recall": recall, "qps": qps})
+        print(f"{nprobe:>8} {recall:>8.3f} {qps:>10.1f} {qps / exact_qps:>7.1f}x")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an IVF index and measure recall@k vs QPS")
+    parser.add_argument("--store", help="NumpyFlatVectorStore directory; the index is saved in <store>/ivf")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-lists", type=int)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.store:
+        from vector_stores import NumpyFlatVectorStore
+        data = NumpyFlatVectorStore(args.store).live_matrix()
+        queries = np.asarray(data[rng.integers(0, len(data), size=args.queries)])
+        queries = queries + 0.05 * rng.normal(size=queries.shape)
+        index_path = os.path.join(args.store, "ivf")
+    else:
+        data = synthetic_vectors(args.n + args.queries, args.dim)
+        data, queries = data[:args.n], data[args.n:]
+        index_path = "./ivf_index_synthetic"
+
+    started = time.perf_counter()
+    IVFIndex.build(data, n_lists=args.n_lists, path=index_path)
+    print(f"Built and saved to {index_path} in {time.perf_counter() - started:.1f}s")
+
+    index = IVFIndex.load(index_path)  # Memory-mapped
+    benchmark(index, data, queries, k=args.k, nprobes=args.nprobe)
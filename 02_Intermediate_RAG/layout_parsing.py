@@ -1,7 +1,10 @@
 import chromadb
 from chromadb.utils import embedding_functions
 from langchain_text_splitters import MarkdownHeaderTextSplitter
-import uuid
+import argparse
+import numpy as np
+from delta_ingestion import DeltaIngestor, load_pii_scanner
+from metadata_index import MetadataIndex
 
 # 1. Simulate a Document with Structure (Layout)
 # In a real scenario, this might come from a PDF parser that detects headers/sections.
@@ -45,27 +48,31 @@ for split in md_header_splits:
     print("-" * 20)
 
 # 3. Ingest into ChromaDB with Metadata
+# Delta ingestion: chunk ids are derived from the content, so re-running after editing
+# one section only upserts that section's chunks (and deletes the chunks it replaced).
+# Upserted chunks get their PII verdict in the same write.
+# Pass --rebuild to drop the collection and start over.
+parser = argparse.ArgumentParser()
+parser.add_argument("--rebuild", action="store_true", help="Drop the collection and re-ingest everything")
+args = parser.parse_args()
+
 client = chromadb.PersistentClient(path="./chroma_db_layout_test")
 collection_name = "policy_collection"
 
-# Cleanup
-try:
-    client.delete_collection(name=collection_name)
-except:
-    pass
-
-collection = client.create_collection(name=collection_name)
+ingestor = DeltaIngestor.open(
+    client,
+    collection_name,
+    manifest_path=f"./chroma_db_layout_test/{collection_name}_manifest.json",
+    rebuild=args.rebuild,
+    annotate_fn=load_pii_scanner(),
+)
+collection = ingestor.collection
 
 documents = [split.page_content for split in md_header_splits]
 metadatas = [split.metadata for split in md_header_splits]
-ids = [str(uuid.uuid4()) for _ in md_header_splits]
 
-collection.add(
-    documents=documents,
-    metadatas=metadatas,
-    ids=ids
-)
-print("\n--- 3. Ingestion Complete ---")
+stats = ingestor.sync_source("employee_handbook.md", documents, metadatas)
+print(f"\n--- 3. Ingestion Complete: {stats} ---")
 
 # 4. Query with Metadata Filtering
 # Scenario: User specifically asks about Remote Work equipment.
@@ -100,3 +107,31 @@ results_wrong_filter = collection.query(
 # This might return nothing or a less relevant match depending on collection size,
 # but it proves we are constrained to the wrong section.
 print(f"Top Result (With Filter 'Leave Policy'): {results_wrong_filter['documents'][0][0] if results_wrong_filter['documents'][0] else 'No match'}")
+
+# 5. Bitmap Pre-Filtering
+# Instead of letting the vector search scan everything and filter afterwards, resolve the
+# `where` filter on a bitmap index first, then score ONLY the candidate chunks.
+metadata_index = MetadataIndex()
+metadata_index.add_many(ingestor.chunk_ids("employee_handbook.md", documents), metadatas)
+query_ef = embedding_functions.DefaultEmbeddingFunction()
+
+def prefiltered_query(query, where, n_results=1, max_candidates=10_000):
+    candidate_ids = metadata_index.candidate_ids(where)
+    if not candidate_ids:
+        return []
+    if len(candidate_ids) > max_candidates:
+        # Not selective enough to be worth scoring here; let the ANN index handle it
+        return collection.query(query_texts=[query], n_results=n_results, where=where)["documents"][0]
+
+    candidates = collection.get(ids=candidate_ids, include=["embeddings", "documents"])
+    query_vector = np.asarray(query_ef([query])[0])
+    # Squared L2, the collection's default distance
+    distances = ((np.asarray(candidates["embeddings"]) - query_vector) ** 2).sum(axis=1)
+    top = np.argsort(distances)[:n_results]
+    return [candidates["documents"][i] for i in top]
+
+print(f"\n--- 5. Bitmap Pre-Filter: '{query}' ---")
+where = {"$or": [{"Header 2": "2. Remote Work"}, {"Header 3": {"$in": ["2.1 Eligibility", "2.2 Equipment"]}}]}
+print(f"Candidates for {where}: {len(metadata_index.resolve(where))} of {len(metadata_index)} chunks")
+top_docs = prefiltered_query(query, where)
+print(f"Top Result (Pre-Filtered 'Remote Work'): {top_docs[0] if top_docs else 'No match'}")
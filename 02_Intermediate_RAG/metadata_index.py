@@ -0,0 +1,185 @@
+"""
+Bitmap metadata index for pre-filtered retrieval.
+
+Filtering by metadata after scoring means every query scores the whole
+collection and then throws most of it away. This index keeps one bitmap of row
+numbers per (field, value) pair. A `where` filter is resolved with bitwise
+AND / OR on those bitmaps into a candidate set BEFORE any vector or keyword
+scoring, so a selective filter (one tenant, one section) makes a query cheaper.
+
+Bitmaps are compressed roaring-style: rows are grouped in blocks of 65536 and
+only non-empty blocks are stored, each as a Python int used as a bitset.
+
+Supported filter syntax (same shape as Chroma's `where`):
+    {"field": value}                         equality
+    {"field": {"$eq" | "$ne": value}}
+    {"field": {"$in" | "$nin": [values]}}
+    {"$and": [filter, ...]}, {"$or": [filter, ...]}
+
+As in Chroma, `$ne` / `$nin` only match rows that HAVE the field: each field
+also keeps a presence bitmap, and the negations are taken within it.
+"""
+
+_BLOCK_BITS = 16
+_BLOCK_MASK = (1 << _BLOCK_BITS) - 1
+
+
+class Bitmap:
+    __slots__ = ("blocks",)
+
+    def __init__(self, blocks=None):
+        self.blocks = blocks or {}  # block number -> int bitset of the low 16 bits
+
+    @classmethod
+    def from_rows(cls, rows):
+        bitmap = cls()
+        for row in rows:
+            bitmap.add(row)
+        return bitmap
+
+    def copy(self):
+        # Blocks are immutable ints, so copying the dict is enough
+        return Bitmap(dict(self.blocks))
+
+    def add(self, row):
+        high = row >> _BLOCK_BITS
+        self.blocks[high] = self.blocks.get(high, 0) | (1 << (row & _BLOCK_MASK))
+
+    def discard(self, row):
+        high = row >> _BLOCK_BITS
+        bits = self.blocks.get(high, 0) & ~(1 << (row & _BLOCK_MASK))
+        if bits:
+            self.blocks[high] = bits
+        else:
+            self.blocks.pop(high, None)
+
+    def __contains__(self, row):
+        return bool(self.blocks.get(row >> _BLOCK_BITS, 0) >> (row & _BLOCK_MASK) & 1)
+
+    def __and__(self, other):
+        small, large = (self, other) if len(self.blocks) <= len(other.blocks) else (other, self)
+        blocks = {}
+        for high, bits in small.blocks.items():
+            both = bits & large.blocks.get(high, 0)
+            if both:
+                blocks[high] = both
+        return Bitmap(blocks)
+
+    def __or__(self, other):
+        blocks = dict(self.blocks)
+        for high, bits in other.blocks.items():
+            blocks[high] = blocks.get(high, 0) | bits
+        return Bitmap(blocks)
+
+    def __sub__(self, other):
+        blocks = {}
+        for high, bits in self.blocks.items():
+            rest = bits & ~other.blocks.get(high, 0)
+            if rest:
+                blocks[high] = rest
+        return Bitmap(blocks)
+
+    def __len__(self):
+        return sum(bits.bit_count() for bits in self.blocks.values())
+
+    def __bool__(self):
+        return bool(self.blocks)
+
+    def __iter__(self):
+        # Rows in ascending order
+        for high in sorted(self.blocks):
+            bits = self.blocks[high]
+            while bits:
+                lowest = bits & -bits
+                yield (high << _BLOCK_BITS) | (lowest.bit_length() - 1)
+                bits ^= lowest
+
+
+class MetadataIndex:
+    def __init__(self):
+        self.bitmaps = {}  # (field, value) -> Bitmap
+        self.field_rows = {}  # field -> Bitmap of the rows that have it
+        self.all_rows = Bitmap()
+        self.row_ids = []
+        self.row_metadata = []
+        self.row_of = {}  # doc_id -> row
+
+    def __len__(self):
+        return len(self.all_rows)
+
+    def add(self, doc_id, metadata):
+        if doc_id in self.row_of:
+            self.delete(doc_id)
+        row = len(self.row_ids)
+        self.row_ids.append(doc_id)
+        self.row_metadata.append(metadata)
+        self.row_of[doc_id] = row
+        self.all_rows.add(row)
+        for field, value in (metadata or {}).items():
+            self.bitmaps.setdefault((field, value), Bitmap()).add(row)
+            self.field_rows.setdefault(field, Bitmap()).add(row)
+        return row
+
+    def add_many(self, doc_ids, metadatas):
+        for doc_id, metadata in zip(doc_ids, metadatas):
+            self.add(doc_id, metadata)
+
+    def delete(self, doc_id):
+        row = self.row_of.pop(doc_id, None)
+        if row is None:
+            return False
+        self.all_rows.discard(row)
+        for field, value in (self.row_metadata[row] or {}).items():
+            self.bitmaps[(field, value)].discard(row)
+            self.field_rows[field].discard(row)
+        self.row_metadata[row] = None
+        return True
+
+    def resolve(self, where):
+        """
+        Returns the Bitmap of rows matching `where` (all rows for an empty filter).
+        Always a new Bitmap: the caller may modify it without touching the index.
+        """
+        if not where:
+            return self.all_rows.copy()
+        result = None
+        for key, condition in where.items():
+            if key == "$and":
+                bitmap = self.all_rows
+                for clause in condition:
+                    bitmap = bitmap & self.resolve(clause)
+            elif key == "$or":
+                bitmap = Bitmap()
+                for clause in condition:
+                    bitmap = bitmap | self.resolve(clause)
+            elif key.startswith("$"):
+                raise ValueError(f"Unsupported logical operator: {key}")
+            else:
+                bitmap = self._resolve_field(key, condition)
+            # Several keys in one dict are an implicit AND
+            result = bitmap if result is None else result & bitmap
+        return result
+
+    def _resolve_field(self, field, condition):
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        (op, value), = condition.items()
+        if op == "$eq":
+            bitmap = self.bitmaps.get((field, value))
+            return bitmap.copy() if bitmap is not None else Bitmap()
+        # Negations never match rows that lack the field
+        present = self.field_rows.get(field, Bitmap())
+        if op == "$ne":
+            return present - self.bitmaps.get((field, value), Bitmap())
+        if op in ("$in", "$nin"):
+            bitmap = Bitmap()
+            for v in value:
+                bitmap = bitmap | self.bitmaps.get((field, v), Bitmap())
+            return bitmap if op == "$in" else present - bitmap
+        raise ValueError(f"Unsupported operator for bitmap filtering: {op}")
+
+    def candidate_rows(self, where):
+        return list(self.resolve(where))
+
+    def candidate_ids(self, where):
+        return [self.row_ids[row] for row in self.resolve(where)]
@@ -0,0 +1,242 @@
+"""
+Quantized vector storage with full-precision re-scoring.
+
+A 384-d float32 all-MiniLM vector takes 1536 bytes. At tens of millions of
+chunks that no longer fits in RAM. Two compression modes:
+
+- Scalar quantization (int8): each dimension is mapped to 256 levels between
+  its min and max. 4x smaller, scores are nearly exact.
+- Product quantization (PQ): the vector is cut into `m` sub-vectors and each is
+  replaced by the id of its nearest of 256 k-means centroids (1 byte each).
+  With m=48, 384-d vectors shrink 32x. Scores come from per-query lookup tables.
+
+Search scores every vector on its compressed codes, keeps a shortlist, then
+re-scores only the shortlist with the full-precision vectors (which can stay
+memory-mapped on disk, e.g. a NumpyFlatVectorStore matrix).
+
+Run this file to print memory use and recall@k for several settings:
+    python quantization.py                      # synthetic clustered vectors
+    python quantization.py --store ./flat_store/demo_collection
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from vector_stores import normalize_rows, top_k_rows
+
+
+def kmeans(data, k, n_iter=20, seed=0, block_size=65_536):
+    """
+    Plain Lloyd's k-means. Returns (centroids, assignments).
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = assign_clusters(data, centroids, block_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        counts = np.bincount(assignments, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters with random points so all k centroids stay useful
+        centroids[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+    return centroids, assign_clusters(data, centroids, block_size)
+
+
+def assign_clusters(data, centroids, block_size=65_536, max_block_distances=1 << 22):
+    # argmin ||x - c||^2 = argmin (||c||^2 - 2 x.c); computed in blocks to bound memory.
+    # The (block x k) distance matrix is capped too: with 10k+ IVF lists, 65536 rows would be GBs
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    block_size = max(1, min(block_size, max_block_distances // len(centroids)))
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), block_size):
+        block = np.asarray(data[start:start + block_size], dtype=np.float32)
+        assignments[start:start + block_size] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignments
+
+
+class ScalarQuantizer:
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.low = vectors.min(axis=0)
+        self.scale = np.maximum(vectors.max(axis=0) - self.low, 1e-12) / 255
+        return self
+
+    def encode(self, vectors):
+        levels = np.rint((np.asarray(vectors, dtype=np.float32) - self.low) / self.scale)
+        return (np.clip(levels, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes):
+        return (codes.astype(np.float32) + 128) * self.scale + self.low
+
+    def scores(self, queries, codes, block_size=65_536):
+        # q.x ~= (q * scale).code + (q * scale).128 + q.low, no decoding of the whole matrix
+        weights = queries * self.scale
+        offset = weights.sum(axis=1, keepdims=True) * 128 + (queries @ self.low)[:, None]
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), block_size):
+            out[:, start:start + block_size] = weights @ codes[start:start + block_size].astype(np.float32).T
+        return out + offset
+
+    def nbytes(self, codes):
+        return codes.nbytes + self.low.nbytes + self.scale.nbytes
+
+
+class ProductQuantizer:
+    def __init__(self, m=8, n_centroids=256, n_iter=20, seed=0):
+        self.m = m
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.seed = seed
+
+    def fit(self, vectors, sample_size=100_000):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1]
+        if dim % self.m:
+            raise ValueError(f"Dimension {dim} is not divisible by m={self.m}")
+        self.sub_dim = dim // self.m
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > sample_size:
+            vectors = vectors[np.sort(rng.choice(len(vectors), size=sample_size, replace=False))]
+
+        self.codebooks = np.stack([
+            kmeans(self._sub(vectors, j), self.n_centroids, self.n_iter, seed=self.seed + j)[0]
+            for j in range(self.m)
+        ])  # (m, n_centroids, sub_dim)
+        return self
+
+    def _sub(self, vectors, j):
+        return vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+
+    def encode(self, vectors, block_size=65_536):
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for start in range(0, len(vectors), block_size):
+            block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+            for j in range(self.m):
+                codes[start:start + block_size, j] = assign_clusters(self._sub(block, j), self.codebooks[j])
+        return codes
+
+    def decode(self, codes):
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(self.m)], axis=1)
+
+    def scores(self, queries, codes):
+        # Asymmetric distance: one (m x 256) table of sub-vector dot products per query,
+        # then every vector's score is m table lookups.
+        tables = np.einsum("qmd,mcd->qmc", queries.reshape(len(queries), self.m, self.sub_dim), self.codebooks)
+        out = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for j in range(self.m):
+            out += tables[:, j, codes[:, j]]
+        return out
+
+    def nbytes(self, codes):
+        return codes.nbytes + self.codebooks.nbytes
+
+
+class QuantizedIndex:
+    """
+    Approximate scores on compressed codes, exact re-scoring of a shortlist.
+
+    `vectors` are the full-precision, normalized rows (a np.memmap is fine: only
+    shortlisted rows are ever read from it at query time).
+    """
+
+    def __init__(self, vectors, quantizer):
+        self.vectors = vectors
+        self.quantizer = quantizer
+        self.codes = quantizer.encode(vectors)
+
+    def memory_bytes(self):
+        return self.quantizer.nbytes(self.codes)
+
+    def search(self, queries, k=10, shortlist=100):
+        queries = normalize_rows(np.atleast_2d(queries))
+        k = min(k, len(self.codes))
+        approx = self.quantizer.scores(queries, self.codes)
+        candidates = top_k_rows(approx, max(k, shortlist))
+        if shortlist <= 0:
+            return candidates[:, :k], np.take_along_axis(approx, candidates[:, :k], axis=1)
+
+        # Re-score at full precision; sorted row order keeps memmap reads sequential
+        rows = np.empty((len(queries), k), dtype=np.int64)
+        sims = np.empty((len(queries), k), dtype=np.float32)
+        for q, cand in enumerate(candidates):
+            cand = np.sort(cand)
+            exact = np.asarray(self.vectors[cand]) @ queries[q]
+            best = top_k_rows(exact[None, :], k)[0]
+            rows[q], sims[q] = cand[best], exact[best]
+        return rows, sims
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def evaluate_settings(vectors, queries, k=10):
+    """
+    Prints memory and recall@k (against exact search) for each quantization setting.
+    """
+    vectors = normalize_rows(vectors)
+    queries = normalize_rows(queries)
+    truth = top_k_rows(queries @ vectors.T, k)
+    dim = vectors.shape[1]
+
+    settings = [("float32 (exact)", None, 0)]
+    settings += [("int8 scalar", ScalarQuantizer(), s) for s in (0, 4 * k)]
+    for m in (dim // 4, dim // 8, dim // 16):
+        if m and dim % m == 0:
+            settings += [(f"PQ m={m}", ProductQuantizer(m=m), s) for s in (0, 10 * k)]
+
+    print(f"{len(vectors)} vectors x {dim} dims, {len(queries)} queries, recall@{k}")
+    print(f"{'setting':<18} {'rescore':>8} {'memory':>12} {'ratio':>7} {'recall':>8} {'ms/query':>9}")
+    built = {}
+    report = []
+    for name, quantizer, shortlist in settings:
+        if quantizer is None:
+            memory, started = vectors.nbytes, time.perf_counter()
+            found = top_k_rows(queries @ vectors.T, k)
+        else:
+            if name not in built:
+                built[name] = QuantizedIndex(vectors, quantizer.fit(vectors))
+            index = built[name]
+            memory, started = index.memory_bytes(), time.perf_counter()
+            found, _ = index.search(queries, k=k, shortlist=shortlist)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = recall_at_k(found, truth)
+        report.append({"setting": name, "rescore": shortlist, "memory_bytes": memory, "recall": recall, "ms_per_query": elapsed_ms})
+        print(f"{name:<18} {shortlist or '-':>8} {memory / 2**20:>10.2f}MB {vectors.nbytes / memory:>6.1f}x {recall:>8.3f} {elapsed_ms:>9.3f}")
+    return report
+
+
+def synthetic_vectors(n, dim, n_topics=100, seed=0):
+    # Clustered data behaves more like real embeddings than uniform noise does
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    return centers[rng.integers(0, n_topics, size=n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory vs recall@k for quantized embeddings")
+    parser.add_argument("--store", help="NumpyFlatVectorStore directory to evaluate instead of synthetic data")
+    parser.add_argument("--n", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.store:
+        from vector_stores import NumpyFlatVectorStore
+        data = np.asarray(NumpyFlatVectorStore(args.store).live_matrix())
+        rng = np.random.default_rng(0)
+        # Held-in queries: perturbed copies of stored vectors
+        queries = data[rng.integers(0, len(data), size=args.queries)] + 0.05 * rng.normal(size=(args.queries, data.shape[1]))
+    else:
+        data = synthetic_vectors(args.n + args.queries, args.dim)
+        data, queries = data[:args.n], data[args.n:]
+
+    evaluate_settings(data, queries, k=args.k)
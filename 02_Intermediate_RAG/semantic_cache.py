@@ -0,0 +1,194 @@
+"""
+Semantic query-result cache.
+
+Real traffic repeats itself: the same question, or a paraphrase of it
+("What is RAG?" / "what's RAG"), arrives over and over. This cache sits in
+front of retrieval and returns a stored result when the new query's embedding
+is within `threshold` cosine similarity of a cached query.
+
+- Exact repeats (same normalized text) are found by dictionary lookup, without
+  embedding the query at all.
+- Near-duplicates are found with one matrix-vector product over a fixed-size
+  matrix of cached query embeddings.
+- Entries are evicted least-recently-used once `max_entries` is reached, and
+  expire after `ttl_seconds`.
+- `params` (n_results, alpha, ...) are part of the key: a hit needs the same params.
+- `version_fn` is called on every lookup. When its return value changes (e.g. the
+  collection's manifest was rewritten by an ingestion run) the whole cache is dropped.
+
+    cache = SemanticCache(embed_fn, threshold=0.95, version_fn=file_version(manifest_path))
+    results, hit = cache.get_or_compute(
+        query, lambda embedding: collection.query(query_embeddings=[embedding], ...), params=(n_results,))
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+
+def file_version(path):
+    """
+    A version_fn that changes whenever `path` is rewritten (None while it does not exist).
+    """
+    def version():
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    return version
+
+
+class SemanticCache:
+    def __init__(self, embed_fn, threshold=0.95, max_entries=1024, ttl_seconds=3600, version_fn=None, clock=time.monotonic):
+        self.embed_fn = embed_fn  # list of texts -> list of vectors
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_fn = version_fn
+        self.clock = clock
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+        self._version = version_fn() if version_fn else None
+        self._reset()
+
+    def _reset(self):
+        self._embeddings = None                       # (max_entries, dim), allocated on first put
+        self._live = np.zeros(self.max_entries, dtype=bool)
+        self._param_codes = np.full(self.max_entries, -1, dtype=np.int64)
+        self._param_code_of = {}                      # params -> small int, so the mask is one comparison
+        self._entries = [None] * self.max_entries     # slot -> (exact_key, result, expires_at)
+        self._slot_of = {}                            # (params, normalized text) -> slot
+        self._lru = OrderedDict()                     # slot -> None, least recently used first
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._lru)
+
+    # --- Public API ---
+    def embed(self, query):
+        return np.asarray(self.embed_fn([query])[0], dtype=np.float32)
+
+    def get(self, query, params=(), embedding=None):
+        """
+        Cached result for `query` or None. Pass `embedding` to skip embedding the query.
+        """
+        return self._lookup(query, params, embedding)[0]
+
+    def put(self, query, result, params=(), embedding=None):
+        if embedding is None:
+            embedding = self.embed(query)
+        embedding = _unit(embedding)
+        exact_key = (params, normalize_text(query))
+        with self._lock:
+            self._check_version()
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_entries, len(embedding)), dtype=np.float32)
+            slot = self._slot_of.get(exact_key)
+            if slot is None:
+                if not self._free:
+                    self._evict(next(iter(self._lru)))
+                    self.stats["evictions"] += 1
+                slot = self._free.pop()
+            self._embeddings[slot] = embedding
+            self._live[slot] = True
+            self._param_codes[slot] = self._param_code_of.setdefault(params, len(self._param_code_of))
+            self._entries[slot] = (exact_key, result, self.clock() + self.ttl_seconds)
+            self._slot_of[exact_key] = slot
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def get_or_compute(self, query, compute_fn, params=()):
+        """
+        Returns (result, hit). On a miss compute_fn(query_embedding) is called and its
+        result cached; the embedding is passed on so retrieval does not embed the query twice.
+        """
+        result, embedding = self._lookup(query, params)
+        if result is not None:
+            return result, True
+        version = self._version
+        result = compute_fn(embedding)
+        with self._lock:
+            self._check_version()
+            stale = self._version != version  # The collection changed while computing
+        if not stale:
+            self.put(query, result, params, embedding=embedding)
+        return result, False
+
+    def invalidate(self):
+        with self._lock:
+            self._reset()
+            self.stats["invalidations"] += 1
+
+    # --- Internals ---
+    def _lookup(self, query, params=(), embedding=None):
+        # Returns (result or None, query embedding or None if it was never needed)
+        exact_key = (params, normalize_text(query))
+        with self._lock:
+            self._check_version()
+            slot = self._slot_of.get(exact_key)
+            if slot is not None and self._fresh(slot):
+                return self._hit(slot, "exact_hits"), embedding
+        if embedding is None:
+            embedding = self.embed(query)  # Outside the lock: the model call is the slow part
+        with self._lock:
+            slot = self._nearest(embedding, params)
+            if slot is not None:
+                return self._hit(slot, "semantic_hits"), embedding
+            self.stats["misses"] += 1
+            return None, embedding
+
+    # The methods below are called with the lock held
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            self._reset()
+            self.stats["invalidations"] += 1
+
+    def _fresh(self, slot):
+        if self._entries[slot][2] > self.clock():
+            return True
+        self._evict(slot)
+        self.stats["expired"] += 1
+        return False
+
+    def _nearest(self, embedding, params):
+        code = self._param_code_of.get(params)
+        if self._embeddings is None or code is None:
+            return None
+        sims = self._embeddings @ _unit(embedding)
+        sims[~self._live | (self._param_codes != code)] = -np.inf
+        # Expired entries can be the best match; drop them and look again
+        while True:
+            slot = int(np.argmax(sims))
+            if sims[slot] < self.threshold:
+                return None
+            if self._fresh(slot):
+                return slot
+            sims[slot] = -np.inf
+
+    def _hit(self, slot, kind):
+        self.stats[kind] += 1
+        self._lru.move_to_end(slot)
+        return self._entries[slot][1]
+
+    def _evict(self, slot):
+        exact_key = self._entries[slot][0]
+        del self._slot_of[exact_key]
+        del self._lru[slot]
+        self._entries[slot] = None
+        self._live[slot] = False
+        self._free.append(slot)
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
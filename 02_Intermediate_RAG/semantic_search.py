@@ -1,38 +1,91 @@
 import chromadb
 from chromadb.utils import embedding_functions
+import os
+from vector_stores import ChromaVectorStore, NumpyFlatVectorStore
+from semantic_cache import SemanticCache, file_version
 
 # 1. Connect to the existing DB
 client = chromadb.PersistentClient(path="./chroma_db_data")
+embedding_function = embedding_functions.DefaultEmbeddingFunction()
 
 # 2. Get the collection
 collection = client.get_collection(
     name="demo_collection",
-    embedding_function=embedding_functions.DefaultEmbeddingFunction()
+    embedding_function=embedding_function
+)
+
+MANIFEST_PATH = "./chroma_db_data/demo_collection_manifest.json"
+manifest_version = file_version(MANIFEST_PATH)
+
+# 3. Pick a vector store backend (same query API for both)
+# - "chroma": Chroma's HNSW index (default)
+# - "numpy":  exact brute-force search over a memory-mapped float32 matrix,
+#             kept in sync with the Chroma collection through the ingestion manifest
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+
+if VECTOR_BACKEND == "numpy":
+    vector_store = NumpyFlatVectorStore("./flat_store/demo_collection", embedding_function=embedding_function)
+else:
+    vector_store = ChromaVectorStore(collection)
+synced_version = None
+
+def sync_flat_store():
+    # Delta ingestion upserts and deletes chunks in Chroma and rewrites the manifest;
+    # replay those changes on the flat store before it answers (a stat() when nothing changed)
+    global synced_version
+    version = manifest_version()
+    if VECTOR_BACKEND != "numpy" or version == synced_version:
+        return
+    if version is None:
+        print("(No ingestion manifest: the flat store cannot be synced, run ingestion.py)")
+    else:
+        changes = vector_store.sync_from_manifest(collection, MANIFEST_PATH)
+        if any(changes.values()):
+            print(f"(Flat store synced with the collection: {changes})")
+    synced_version = version
+
+sync_flat_store()
+
+# 4. Semantic result cache
+# Repeated and paraphrased queries (cosine >= 0.95) are answered from memory.
+# Ingestion rewrites the manifest, which drops the whole cache.
+query_cache = SemanticCache(
+    embedding_function,
+    threshold=0.95,
+    max_entries=1024,
+    ttl_seconds=3600,
+    version_fn=manifest_version,
 )
 
 def query_vector_db(query_text, n_results=2):
-    print(f"\n--- Querying for: '{query_text}' ---")
+    print(f"\n--- Querying for: '{query_text}' ({VECTOR_BACKEND}) ---")
+    sync_flat_store()
     
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=n_results,
-        include=["documents", "metadatas", "distances"]
+    results, hit = query_cache.get_or_compute(
+        query_text,
+        lambda embedding: vector_store.query(query_embeddings=[embedding], n_results=n_results),
+        params=(n_results,),
     )
+    if hit:
+        print("(served from the semantic cache)")
     
-    # Chroma returns lists of lists (one list per query). We only have 1 query.
+    # Both backends return lists of lists (one list per query). We only have 1 query.
     for i in range(len(results["ids"][0])):
         doc_id = results["ids"][0][i]
         content = results["documents"][0][i]
         metadata = results["metadatas"][0][i]
-        distance = results["distances"][0][i] # Determine similarity (lower is better for cosine distance in some impls, but Chroma default is distance)
+        distance = results["distances"][0][i] # Cosine distance: lower is more similar
         
         print(f"Result {i+1}:")
         print(f"  ID: {doc_id}")
         print(f"  Content: {content}")
         print(f"  Metadata: {metadata}")
         print(f"  Distance: {distance:.4f}")
+    return results
 
 if __name__ == "__main__":
     query_vector_db("Tell me about neural networks")
     query_vector_db("What is RAG?")
     query_vector_db("coding languages")
+    query_vector_db("what is RAG")  # Paraphrase: cache hit, no vector search
+    print(f"\nCache stats: {query_cache.stats}")
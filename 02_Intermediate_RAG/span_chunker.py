@@ -0,0 +1,154 @@
+"""
+Offset-based recursive chunker.
+
+langchain's splitters need the whole text in memory and return a new string for
+every chunk (overlaps included), so a 300MB document costs several times its
+size just to chunk. This chunker follows the same rules as
+RecursiveCharacterTextSplitter (separator priority, chunk_size, chunk_overlap,
+whitespace stripping) but only produces (start, end) offsets into the source.
+Text is sliced only when a consumer asks for it.
+
+    chunker = SpanChunker(chunk_size=100, chunk_overlap=20)
+    spans = list(chunker.split_spans(text))         # [(0, 98), (80, 176), ...]
+    chunks = list(chunker.iter_chunks(text))         # slices, created lazily
+
+For input that does not fit in memory, `split_stream` consumes an iterable of
+text pieces (e.g. a file read in blocks) and yields spans with offsets into the
+whole stream while holding at most `window` characters at a time.
+"""
+
+import re
+from collections import deque
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+class SpanChunker:
+    def __init__(self, chunk_size=4000, chunk_overlap=200, separators=None, strip_whitespace=True):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must not be larger than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or DEFAULT_SEPARATORS
+        self.strip_whitespace = strip_whitespace
+        self._patterns = {sep: re.compile(re.escape(sep)) for sep in self.separators if sep}
+
+    # --- Public API ---
+    def split_spans(self, text, start=0, end=None):
+        """
+        Yields (start, end) offsets of the chunks of text[start:end].
+        """
+        end = len(text) if end is None else end
+        yield from self._split(text, start, end, self.separators)
+
+    def iter_chunks(self, text):
+        for start, end in self.split_spans(text):
+            yield text[start:end]
+
+    def split_stream(self, stream, window=1 << 20, with_text=False):
+        """
+        Chunks an iterable of text pieces of any total length.
+
+        Once `window` unprocessed characters are buffered, they are cut at the last
+        occurrence of the highest-priority separator present in the window (the
+        same fallback order as `split_spans`: paragraph break, line break, space,
+        and only then a hard cut). Each part is chunked on its own, so a chunk never
+        crosses a cut (and there is no overlap across it). Offsets are global to the
+        stream.
+        """
+        buffer, start, base = "", 0, 0  # buffer[start:] is unprocessed; buffer[0] is stream offset `base`
+        for piece in stream:
+            # Drop the processed prefix once per piece, so each character is copied O(1) times
+            buffer, base, start = buffer[start:] + piece, base + start, 0
+            while len(buffer) - start >= window:
+                cut = self._stream_cut(buffer, start, start + window)
+                yield from self._emit(buffer, start, cut, base, with_text)
+                # The separator stays at the start of the next part, like keep_separator="start"
+                start = cut
+        yield from self._emit(buffer, start, len(buffer), base, with_text)
+
+    # --- Internals ---
+    def _emit(self, buffer, start, end, base, with_text):
+        for s, e in self._split(buffer, start, end, self.separators):
+            yield (base + s, base + e, buffer[s:e]) if with_text else (base + s, base + e)
+
+    def _stream_cut(self, buffer, start, end):
+        for sep in self.separators:
+            if sep == "":
+                break
+            # Search from start + 1: the part may itself start with the separator
+            cut = buffer.rfind(sep, start + 1, end)
+            if cut != -1:
+                return cut
+        return end  # No separator in the window: hard cut
+
+    def _pieces(self, text, start, end, separator):
+        # Split text[start:end] on `separator`, keeping it at the start of the following piece
+        if separator == "":
+            yield from ((i, i + 1) for i in range(start, end))
+            return
+        previous = start
+        for match in self._patterns[separator].finditer(text, start, end):
+            if match.start() > previous:
+                yield previous, match.start()
+            previous = match.start()
+        if end > previous:
+            yield previous, end
+
+    def _split(self, text, start, end, separators):
+        # 1. Pick the first separator that occurs in this range
+        separator, remaining = separators[-1], []
+        for i, sep in enumerate(separators):
+            if sep == "":
+                separator = sep
+                break
+            if self._patterns[sep].search(text, start, end):
+                separator, remaining = sep, separators[i + 1:]
+                break
+
+        # 2. Merge small pieces, recurse into pieces that are too large on their own
+        good = []
+        for piece in self._pieces(text, start, end, separator):
+            if piece[1] - piece[0] < self.chunk_size:
+                good.append(piece)
+                continue
+            if good:
+                yield from self._merge(text, good)
+                good = []
+            if remaining:
+                yield from self._split(text, piece[0], piece[1], remaining)
+            else:
+                span = self._strip(text, *piece)
+                if span:
+                    yield span
+        if good:
+            yield from self._merge(text, good)
+
+    def _merge(self, text, pieces):
+        # Pieces are contiguous, so a chunk is just (first piece start, last piece end)
+        current = deque()
+        total = 0
+        for piece in pieces:
+            length = piece[1] - piece[0]
+            if total + length > self.chunk_size and current:
+                span = self._strip(text, current[0][0], current[-1][1])
+                if span:
+                    yield span
+                # Drop pieces from the front until what is left fits as overlap
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= current[0][1] - current[0][0]
+                    current.popleft()
+            current.append(piece)
+            total += length
+        if current:
+            span = self._strip(text, current[0][0], current[-1][1])
+            if span:
+                yield span
+
+    def _strip(self, text, start, end):
+        if self.strip_whitespace:
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+        return (start, end) if end > start else None
@@ -0,0 +1,308 @@
+"""
+Pluggable vector stores behind one query API.
+
+Both backends answer `query(query_texts=... | query_embeddings=..., n_results=...)`
+with the same result shape Chroma uses (one list per query):
+    {"ids": [[...]], "documents": [[...]], "metadatas": [[...]], "distances": [[...]]}
+
+- ChromaVectorStore:     wraps a Chroma collection (HNSW approximate search).
+- NumpyFlatVectorStore:  exact brute force over a contiguous float32 matrix,
+  memory-mapped from disk, rows normalized once at write time. A query batch is
+  one matrix multiply plus argpartition per block of rows. Up to a few million
+  chunks this is fast and, unlike HNSW, its latency and recall are predictable.
+
+Distances are cosine distances (1 - cosine similarity) for the NumPy store,
+matching a Chroma collection created with {"hnsw:space": "cosine"}.
+
+Both stores support upsert/delete by id. The flat store keeps deleted rows as
+tombstones until `compact()`, and `sync_from_manifest()` mirrors the changes
+that delta ingestion (delta_ingestion.py) made to a Chroma collection.
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class VectorStore(ABC):
+    @abstractmethod
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        ...
+
+    @abstractmethod
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        ...
+
+    @abstractmethod
+    def delete(self, ids):
+        ...
+
+    @abstractmethod
+    def query(self, query_texts=None, query_embeddings=None, n_results=10):
+        ...
+
+    @abstractmethod
+    def count(self):
+        ...
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, collection):
+        self.collection = collection
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.upsert(ids=ids, embeddings=np.asarray(embeddings).tolist(), documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=list(ids))
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10):
+        if query_embeddings is not None:
+            return self.collection.query(
+                query_embeddings=np.asarray(query_embeddings).tolist(),
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"],
+            )
+        return self.collection.query(
+            query_texts=query_texts,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+        )
+
+    def count(self):
+        return self.collection.count()
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def top_k_rows(scores, k):
+    """
+    Indices of the k highest scores in every row, best first. O(N) selection + O(k log k) sort.
+    """
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+class NumpyFlatVectorStore(VectorStore):
+    """
+    On-disk layout:
+        <path>/vectors.f32     normalized float32 rows, appended
+        <path>/records.jsonl   one {"id", "document", "metadata"} line per row,
+                               plus a {"deleted": id} line per delete (tombstone)
+        <path>/meta.json       {"dim": ...}
+        <path>/manifest_snapshot.json   chunk_id -> metadata hash at the last sync
+    """
+
+    def __init__(self, path, embedding_function=None, block_size=262_144):
+        self.path = path
+        self.embedding_function = embedding_function  # Only needed for query_texts
+        self.block_size = block_size
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.records_path = os.path.join(path, "records.jsonl")
+        self.meta_path = os.path.join(path, "meta.json")
+        self.snapshot_path = os.path.join(path, "manifest_snapshot.json")
+        self._load()
+
+    def _load(self):
+        self.dim = None
+        self.ids, self.documents, self.metadatas = [], [], []
+        self.alive = []
+        self.row_of = {}  # Live ids only
+        self._matrix = None
+        self._alive_mask = None
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+            with open(self.records_path, encoding="utf-8") as f:
+                for line in f:
+                    self._remember(json.loads(line))
+
+    @classmethod
+    def from_collection(cls, collection, path, embedding_function=None, page_size=10_000):
+        """
+        Exports a Chroma collection (ids, embeddings, documents, metadatas) page by page.
+        """
+        store = cls(path, embedding_function=embedding_function)
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not len(page["ids"]):
+                break
+            new = [i for i, doc_id in enumerate(page["ids"]) if doc_id not in store.row_of]
+            if new:
+                store.add(
+                    [page["ids"][i] for i in new],
+                    np.asarray(page["embeddings"])[new],
+                    [page["documents"][i] for i in new],
+                    [page["metadatas"][i] for i in new],
+                )
+            offset += len(page["ids"])
+        return store
+
+    def _remember(self, record):
+        if "deleted" in record:
+            self.alive[self.row_of.pop(record["deleted"])] = False
+            self._alive_mask = None
+            return
+        self.row_of[record["id"]] = len(self.ids)
+        self.ids.append(record["id"])
+        self.documents.append(record["document"])
+        self.metadatas.append(record["metadata"])
+        self.alive.append(True)
+        self._alive_mask = None
+
+    def count(self):
+        return len(self.row_of)
+
+    def matrix(self):
+        if self._matrix is None or self._matrix.shape[0] != len(self.ids):
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+        return self._matrix
+
+    def live_matrix(self):
+        """
+        Vectors of the live rows: the memmap itself, or a copy when rows were deleted.
+        """
+        if len(self.row_of) == len(self.ids):
+            return self.matrix()
+        return np.asarray(self.matrix()[np.flatnonzero(self.alive)])
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        duplicates = [doc_id for doc_id in ids if doc_id in self.row_of]
+        if duplicates:
+            raise ValueError(f"Ids already in the store (use upsert to replace them): {duplicates[:5]}")
+        vectors = normalize_rows(embeddings)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"dim": self.dim}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Store holds {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.records_path, "a", encoding="utf-8") as f:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                record = {"id": doc_id, "document": document, "metadata": metadata}
+                f.write(json.dumps(record) + "\n")
+                self._remember(record)
+
+    def delete(self, ids):
+        """
+        Tombstones the rows of `ids` (unknown ids are ignored). Returns how many were deleted.
+        """
+        ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in self.row_of]
+        with open(self.records_path, "a", encoding="utf-8") as f:
+            for doc_id in ids:
+                f.write(json.dumps({"deleted": doc_id}) + "\n")
+                self._remember({"deleted": doc_id})
+        return len(ids)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        # Replaced rows become tombstones; the new versions are appended
+        self.delete(ids)
+        self.add(ids, embeddings, documents, metadatas)
+
+    def compact(self):
+        """
+        Rewrites the files without tombstoned rows. Row numbers change.
+        """
+        live = [row for row, ok in enumerate(self.alive) if ok]
+        if len(live) == len(self.ids):
+            return
+        matrix = self.matrix()
+        with open(self.vectors_path + ".tmp", "wb") as f:
+            for start in range(0, len(live), self.block_size):
+                f.write(np.ascontiguousarray(matrix[live[start:start + self.block_size]]).tobytes())
+        with open(self.records_path + ".tmp", "w", encoding="utf-8") as f:
+            for row in live:
+                f.write(json.dumps({"id": self.ids[row], "document": self.documents[row], "metadata": self.metadatas[row]}) + "\n")
+        del matrix
+        self._matrix = None
+        os.replace(self.vectors_path + ".tmp", self.vectors_path)
+        os.replace(self.records_path + ".tmp", self.records_path)
+        self._load()
+
+    def sync_from_manifest(self, collection, manifest_path, page_size=1_000):
+        """
+        Mirrors a Chroma collection maintained by DeltaIngestor. The manifest lists
+        every live chunk id with its metadata hash; diffing it against the snapshot
+        from the last sync gives the ids to delete and the ids to re-fetch, so only
+        changed chunks are copied. Returns {"upserted", "deleted"}.
+        """
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        current = {cid: h for chunks in manifest["sources"].values() for cid, h in chunks.items()}
+        previous = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                previous = json.load(f)
+
+        deleted = self.delete([doc_id for doc_id in self.row_of if doc_id not in current])
+        changed = [cid for cid, h in current.items() if cid not in self.row_of or previous.get(cid) != h]
+        for start in range(0, len(changed), page_size):
+            page = collection.get(ids=changed[start:start + page_size], include=["embeddings", "documents", "metadatas"])
+            if len(page["ids"]):
+                self.upsert(page["ids"], np.asarray(page["embeddings"]), page["documents"], page["metadatas"])
+
+        with open(self.snapshot_path + ".tmp", "w") as f:
+            json.dump(current, f)
+        os.replace(self.snapshot_path + ".tmp", self.snapshot_path)
+        return {"upserted": len(changed), "deleted": deleted}
+
+    def search(self, query_embeddings, k):
+        """
+        Exact top-k for a batch of queries: returns (rows, similarities), both (n_queries x k).
+        """
+        queries = normalize_rows(np.atleast_2d(query_embeddings))
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_sims = np.zeros((len(queries), 0), dtype=np.float32)
+        if not self.row_of:
+            return best_rows, best_sims
+        matrix = self.matrix()
+        n_rows = matrix.shape[0]
+        k = min(k, len(self.row_of))  # Never more than the live rows, so tombstones never surface
+        if self._alive_mask is None:
+            self._alive_mask = np.asarray(self.alive, dtype=bool)
+        has_tombstones = len(self.row_of) < n_rows
+
+        # Blocks keep the (queries x rows) score matrix small; the memmap pages in one block at a time
+        for start in range(0, n_rows, self.block_size):
+            sims = queries @ matrix[start:start + self.block_size].T
+            if has_tombstones:
+                sims[:, ~self._alive_mask[start:start + self.block_size]] = -np.inf
+            rows = top_k_rows(sims, k)
+            cand_rows = np.concatenate([best_rows, rows + start], axis=1)
+            cand_sims = np.concatenate([best_sims, np.take_along_axis(sims, rows, axis=1)], axis=1)
+            keep = top_k_rows(cand_sims, k)
+            best_rows = np.take_along_axis(cand_rows, keep, axis=1)
+            best_sims = np.take_along_axis(cand_sims, keep, axis=1)
+        return best_rows, best_sims
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10):
+        if query_embeddings is None:
+            if self.embedding_function is None:
+                raise ValueError("query_texts needs an embedding_function; pass query_embeddings instead")
+            query_embeddings = self.embedding_function(query_texts)
+        rows, sims = self.search(query_embeddings, n_results)
+        return {
+            "ids": [[self.ids[r] for r in row] for row in rows],
+            "documents": [[self.documents[r] for r in row] for row in rows],
+            "metadatas": [[self.metadatas[r] for r in row] for row in rows],
+            "distances": [[float(1 - s) for s in sim] for sim in sims],
+        }
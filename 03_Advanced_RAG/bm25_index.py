@@ -0,0 +1,282 @@
+"""
+Incrementally updatable BM25 keyword index.
+
+TfidfVectorizer has to be refit over the WHOLE collection whenever a document is
+added. This index keeps raw term frequencies as one posting list per term
+(column form: rows + tf, in growable arrays) plus the corpus statistics BM25
+needs (document frequency per term, document lengths, total length).
+
+Nothing global is precomputed: idf and length normalization are applied at
+query time, and only to the posting lists of the query's own terms. Adding or
+deleting a document appends to / tombstones its own postings and updates the
+statistics of its own terms, so an update never triggers a rebuild.
+
+Document texts are only needed to return results and to delete. By default they
+are kept in a list; with `text_path` they are appended to a file on disk and only
+one offset per document stays in memory, so large corpora hold just the postings.
+"""
+
+import os
+import re
+import threading
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+# Same tokenization as sklearn's TfidfVectorizer default (lowercase, 2+ word chars)
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _view(values, dtype=np.int32):
+    # Zero-copy NumPy view of an array('i') / bytearray. Only index into it, never keep
+    # it: while a view exists, the underlying buffer cannot grow
+    return np.frombuffer(values, dtype=dtype)
+
+
+class TextFile:
+    """
+    Append-only UTF-8 file of document texts, indexed by row like a list.
+    Only the byte offsets stay in memory; `texts[row]` reads that row from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w+b")
+        self._offsets = array("q", [0])
+        self._lock = threading.Lock()  # seek + read/write must not interleave across threads
+
+    def append(self, text):
+        data = text.encode("utf-8")
+        with self._lock:
+            self._file.seek(self._offsets[-1])
+            self._file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def __getitem__(self, row):
+        start, end = self._offsets[row], self._offsets[row + 1]
+        with self._lock:
+            self._file.seek(start)
+            return self._file.read(end - start).decode("utf-8")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def keep(self, rows):
+        """
+        Rewrites the file with only `rows`, in order; returns the new TextFile.
+        """
+        compacted = TextFile(self.path + ".tmp")
+        for row in rows:
+            compacted.append(self[row])
+        self._file.close()
+        os.replace(compacted.path, self.path)
+        compacted.path = self.path
+        return compacted
+
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75, text_path=None):
+        self.k1 = k1
+        self.b = b
+
+        # Vocabulary: term -> column, plus document frequency per column
+        self.vocabulary = {}
+        self.doc_freq = []
+
+        # Postings per column: the rows containing the term and the term frequency in each
+        self._posting_rows = []
+        self._posting_tfs = []
+
+        # Row bookkeeping. Deleted rows keep their postings as tombstones (alive=0)
+        # until compact() is called, so row numbers never shift under a running query.
+        self.row_ids = []
+        self.row_documents = TextFile(text_path) if text_path else []
+        self.row_lengths = array("i")
+        self.alive = bytearray()
+        self.row_of = {}  # doc_id -> row
+
+        self.n_alive = 0
+        self.total_length = 0
+
+        # Full BM25-weighted matrix, only built for bulk consumers (weighted_matrix())
+        self._weighted = None
+
+    def __len__(self):
+        return self.n_alive
+
+    def add(self, doc_id, text):
+        if doc_id in self.row_of:
+            self.delete(doc_id)  # Re-adding an id replaces the old version (upsert)
+
+        row = len(self.row_ids)
+        tokens = tokenize(text)
+        term_counts = {}
+        for token in tokens:
+            col = self.vocabulary.get(token)
+            if col is None:
+                col = len(self.vocabulary)
+                self.vocabulary[token] = col
+                self.doc_freq.append(0)
+                self._posting_rows.append(array("i"))
+                self._posting_tfs.append(array("i"))
+            term_counts[col] = term_counts.get(col, 0) + 1
+
+        # Only this document's postings and its terms' statistics change
+        for col, tf in term_counts.items():
+            self._posting_rows[col].append(row)
+            self._posting_tfs[col].append(tf)
+            self.doc_freq[col] += 1
+        self.n_alive += 1
+        self.total_length += len(tokens)
+
+        self.row_of[doc_id] = row
+        self.row_ids.append(doc_id)
+        self.row_documents.append(text)
+        self.row_lengths.append(len(tokens))
+        self.alive.append(1)
+        self._weighted = None
+
+    def add_documents(self, doc_ids, texts):
+        for doc_id, text in zip(doc_ids, texts):
+            self.add(doc_id, text)
+
+    def delete(self, doc_id):
+        row = self.row_of.pop(doc_id, None)
+        if row is None:
+            return False
+
+        for token in set(tokenize(self.row_documents[row])):
+            self.doc_freq[self.vocabulary[token]] -= 1
+        self.n_alive -= 1
+        self.total_length -= self.row_lengths[row]
+        self.alive[row] = 0
+        self._weighted = None
+        return True
+
+    def compact(self):
+        """
+        Drops tombstoned rows. Row numbers change, so only call this between queries.
+        Works on the postings directly: no document is re-read or re-tokenized.
+        Column numbers (and the corpus statistics) do not change.
+        """
+        alive = np.array(self.alive, dtype=bool)
+        live_rows = np.flatnonzero(alive)
+        new_row = (np.cumsum(alive) - 1).astype(np.int32)
+        for col in range(len(self._posting_rows)):
+            rows = _view(self._posting_rows[col])
+            keep = alive[rows]
+            self._posting_rows[col] = array("i", new_row[rows[keep]].tobytes())
+            self._posting_tfs[col] = array("i", _view(self._posting_tfs[col])[keep].tobytes())
+
+        if isinstance(self.row_documents, TextFile):
+            self.row_documents = self.row_documents.keep(live_rows)
+        else:
+            self.row_documents = [self.row_documents[r] for r in live_rows]
+        self.row_ids = [self.row_ids[r] for r in live_rows]
+        self.row_lengths = array("i", _view(self.row_lengths)[live_rows].tobytes())
+        self.alive = bytearray(b"\x01" * len(live_rows))
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.row_ids)}
+        self._weighted = None
+
+    def idf(self, cols=None):
+        df = np.asarray(self.doc_freq if cols is None else [self.doc_freq[c] for c in cols], dtype=np.float64)
+        return np.log1p((self.n_alive - df + 0.5) / (df + 0.5))
+
+    def _weighted_postings(self, cols):
+        """
+        Concatenated postings of `cols` as (rows, BM25 weights, postings per column).
+        idf and length normalization are applied here, to these postings only.
+        """
+        counts = np.array([len(self._posting_rows[c]) for c in cols], dtype=np.int64)
+        if not counts.sum():
+            return np.zeros(0, dtype=np.int64), np.zeros(0), counts
+        rows = np.concatenate([_view(self._posting_rows[c]) for c in cols]).astype(np.int64)
+        tf = np.concatenate([_view(self._posting_tfs[c]) for c in cols]).astype(np.float64)
+        idf = np.repeat(self.idf(cols), counts)
+
+        avg_length = self.total_length / self.n_alive if self.total_length else 1.0
+        length_norm = 1 - self.b + self.b * _view(self.row_lengths)[rows] / avg_length
+        weights = idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        weights *= _view(self.alive, np.uint8)[rows]  # Tombstones never score
+        return rows, weights, counts
+
+    def _query_cols(self, query):
+        # Unknown query terms cannot match anything, so they are simply skipped
+        return sorted({self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary})
+
+    def sparse_scores(self, query):
+        """
+        (rows, scores) for the rows sharing at least one term with the query.
+        Cost follows the query terms' posting lists, not the collection size.
+        """
+        cols = self._query_cols(query)
+        if not cols or not self.n_alive:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        rows, weights, _ = self._weighted_postings(cols)
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        keep = scores > 0
+        return unique_rows[keep], scores[keep]
+
+    def scores(self, query):
+        dense = np.zeros(len(self.row_ids))
+        rows, values = self.sparse_scores(query)
+        dense[rows] = values
+        return dense
+
+    def weighted_matrix(self):
+        """
+        CSC matrix (rows x terms) holding each entry's BM25 contribution, for bulk
+        consumers that score many queries in one sparse product. Built from the
+        postings on demand and cached until the index changes; queries never need it.
+        """
+        if self._weighted is None:
+            n_rows, n_terms = len(self.row_ids), len(self.vocabulary)
+            rows, weights, counts = self._weighted_postings(range(n_terms))
+            indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            self._weighted = sparse.csc_matrix((weights, rows, indptr), shape=(n_rows, n_terms))
+        return self._weighted
+
+    def score_matrix(self, queries):
+        """
+        Dense (n_queries x n_rows) BM25 scores for many queries.
+        """
+        matrix = np.zeros((len(queries), len(self.row_ids)))
+        for q, query in enumerate(queries):
+            rows, values = self.sparse_scores(query)
+            matrix[q, rows] = values
+        return matrix
+
+    def _top_k(self, rows, values, k):
+        # argpartition finds the top k in O(hits); only those k get sorted (ties: lower row first)
+        if len(values) > k:
+            top = np.argpartition(-values, k - 1)[:k]
+            rows, values = rows[top], values[top]
+        order = np.lexsort((rows, -values))
+        return rows[order], values[order]
+
+    def search_batch(self, queries, k=5):
+        """
+        Top-k rows and scores for every query, as two (n_queries x k) arrays.
+        Slots without a match (score 0) hold row -1.
+        """
+        top_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        top_scores = np.zeros((len(queries), k))
+        for q, query in enumerate(queries):
+            rows, values = self._top_k(*self.sparse_scores(query), k)
+            top_rows[q, :len(rows)] = rows
+            top_scores[q, :len(rows)] = values
+        return top_rows, top_scores
+
+    def search(self, query, k=5):
+        rows, values = self._top_k(*self.sparse_scores(query), k)
+        return [(self.row_ids[r], float(s)) for r, s in zip(rows, values)]
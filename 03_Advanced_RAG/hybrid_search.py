@@ -1,7 +1,13 @@
 import chromadb
 from chromadb.utils import embedding_functions
-from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
+import sys
+from pathlib import Path
+from bm25_index import BM25Index
+from score_fusion import fuse_scores
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "02_Intermediate_RAG"))
+from semantic_cache import SemanticCache, file_version
 
 # 1. Setup Retrieval Systems
 client = chromadb.PersistentClient(path="../02_Intermediate_RAG/chroma_db_data")
@@ -13,53 +19,81 @@ existing_data = collection.get()
 documents = existing_data["documents"]
 ids = existing_data["ids"]
 
-# 2. Simple Keyword Search (TF-IDF as proxy for BM25)
-vectorizer = TfidfVectorizer()
-tfidf_matrix = vectorizer.fit_transform(documents)
+# 2. BM25 Keyword Index
+# Unlike TfidfVectorizer, this index is updated document by document:
+# keyword_index.add(doc_id, text) / keyword_index.delete(doc_id) never refit the collection.
+keyword_index = BM25Index()
+keyword_index.add_documents(ids, documents)
 
 def keyword_search(query, k=5):
-    query_vec = vectorizer.transform([query])
-    # Dot product for similarity
-    scores = (tfidf_matrix * query_vec.T).toarray().flatten()
-    # Get top k indices
-    top_indices = scores.argsort()[::-1][:k]
-    return [(ids[i], scores[i]) for i in top_indices if scores[i] > 0]
+    return keyword_index.search(query, k=k)
 
 def vector_search(query, k=5):
     results = collection.query(query_texts=[query], n_results=k)
     # Chroma returns lists, we simplify
     return [(results["ids"][0][i], 1 - results["distances"][0][i]) for i in range(len(results["ids"][0]))]
 
-def hybrid_search(query, alpha=0.5):
-    print(f"\n--- Hybrid Search (Alpha={alpha}) for: '{query}' ---")
-    
-    # Get results from both basic systems
-    kw_results = dict(keyword_search(query, k=5))
-    vec_results = dict(vector_search(query, k=5))
-    
-    # Merge and Normalize scores
-    all_ids = set(kw_results.keys()) | set(vec_results.keys())
-    final_results = []
-    
-    for doc_id in all_ids:
-        # Simple Weighted Fusion
-        # Note: In production, you must normalize scores (e.g., using Reciprocal Rank Fusion - RRF)
-        # because BM25 scores are unbounded while Cosine is 0-1.
-        kw_score = kw_results.get(doc_id, 0)
-        vec_score = vec_results.get(doc_id, 0)
-        
-        # Simple normalization for demo (assuming TF-IDF is somewhat low range)
-        final_score = (alpha * vec_score) + ((1-alpha) * kw_score)
-        
-        # Retrieve content for display
-        idx = ids.index(doc_id)
-        content = documents[idx]
-        final_results.append((doc_id, content, final_score))
+def vector_search_batch(queries, k=5):
+    # One Chroma call for the whole batch, mapped onto the keyword index's rows
+    results = collection.query(query_texts=queries, n_results=k)
+    rows = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.zeros((len(queries), k))
+    for q, (hit_ids, distances) in enumerate(zip(results["ids"], results["distances"])):
+        for j, (doc_id, distance) in enumerate(zip(hit_ids, distances)):
+            rows[q, j] = keyword_index.row_of.get(doc_id, -1)  # id -> row index, O(1)
+            scores[q, j] = 1 - distance
+    return rows, scores
+
+# 3. Score Fusion
+# BM25 scores are unbounded while cosine is 0-1, so raw scores can't be added directly.
+# "rrf" fuses ranks, "minmax"/"zscore" normalize each retriever's scores per query first.
+def hybrid_search_batch(queries, k=3, method="rrf", alpha=0.5, n_candidates=5, batch_size=256):
+    """
+    Hybrid search for many queries at once.
+    alpha weights the vector side, (1 - alpha) the keyword side.
+    Returns one [(doc_id, content, score), ...] list per query.
+    """
+    all_results = []
+    # Batches bound the size of each Chroma call and of the fusion buffers
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        kw = keyword_index.search_batch(batch, k=n_candidates)
+        vec = vector_search_batch(batch, k=n_candidates)
+
+        fused_rows, fused_scores = fuse_scores(
+            [kw, vec], [1 - alpha, alpha],
+            n_rows=len(keyword_index.row_ids), k=k, method=method,
+        )
+        for rows, scores in zip(fused_rows, fused_scores):
+            all_results.append([
+                (keyword_index.row_ids[row], keyword_index.row_documents[row], float(score))
+                for row, score in zip(rows, scores) if row >= 0
+            ])
+    return all_results
+
+# 4. Semantic result cache for interactive queries
+# Paraphrases of a recent query (cosine >= 0.95, same alpha/method) reuse its fused results.
+# The cache is dropped when ingestion rewrites the collection's manifest.
+query_cache = SemanticCache(
+    embedding_functions.DefaultEmbeddingFunction(),
+    threshold=0.95,
+    version_fn=file_version("../02_Intermediate_RAG/chroma_db_data/demo_collection_manifest.json"),
+)
+
+def hybrid_search(query, alpha=0.5, method="minmax"):
+    print(f"\n--- Hybrid Search (Alpha={alpha}, Method={method}) for: '{query}' ---")
     
-    final_results.sort(key=lambda x: x[2], reverse=True)
+    final_results, hit = query_cache.get_or_compute(
+        query,
+        lambda embedding: hybrid_search_batch([query], k=3, method=method, alpha=alpha)[0],
+        params=(alpha, method),
+    )
+    if hit:
+        print("(served from the semantic cache)")
     
-    for res in final_results[:3]:
+    for res in final_results:
         print(f"ID: {res[0]} | Score: {res[2]:.3f} | Content: {res[1]}")
+    return final_results
 
 if __name__ == "__main__":
     # Query that benefits from keyword match
@@ -67,3 +101,10 @@ if __name__ == "__main__":
     
     # Query that benefits from semantic match
     hybrid_search("coding tools for AI", alpha=0.7)
+    hybrid_search("Coding tools for AI?", alpha=0.7)  # Cache hit
+    
+    # Offline / batch usage: many queries fused in one pass with Reciprocal Rank Fusion
+    batch_results = hybrid_search_batch(["machine learning", "transformer paper", "python"], k=2, method="rrf")
+    print("\n--- Batch (RRF) ---")
+    for results in batch_results:
+        print([doc_id for doc_id, _, _ in results])
@@ -1,4 +1,9 @@
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# A search result: (chunk_id, document)
+Hit = Tuple[str, str]
 
 # Mocking an LLM for Query Expansion to avoid API keys in this demo code.
 def ask_llm(prompt):
@@ -23,8 +28,76 @@ def generate_sub_queries(original_query: str) -> List[str]:
     print(f"Generated: {sub_queries}")
     return sub_queries
 
-# In a real pipeline, you would retrieve documents for ALL these queries
-# and use Reciprocal Rank Fusion (RRF) to de-duplicate and rank them.
+# Retrieve documents for ALL sub-queries at once, then merge with Reciprocal Rank Fusion (RRF).
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Hit]], rrf_k: int = 60, top_n: Optional[int] = None) -> List[Tuple[str, str, float]]:
+    """
+    Merges ranked lists into one, de-duplicated by chunk id.
+    A chunk scores sum(1 / (rrf_k + rank)) over the lists it appears in, so chunks
+    found by several sub-queries rise to the top.
+    """
+    scores, documents = {}, {}
+    for hits in result_lists:
+        seen = set()
+        for rank, (chunk_id, document) in enumerate(hits, start=1):
+            if chunk_id in seen:  # Count a chunk once per list
+                continue
+            seen.add(chunk_id)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(chunk_id, document)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])[:top_n]
+    return [(chunk_id, documents[chunk_id], score) for chunk_id, score in ranked]
+
+def fan_out_search(
+    sub_queries: Sequence[str],
+    search_fn: Callable,
+    embed_fn: Optional[Callable] = None,
+    max_workers: int = 8,
+    executor: Optional[ThreadPoolExecutor] = None,
+) -> List[List[Hit]]:
+    """
+    Runs search_fn for every sub-query concurrently; returns one ranked list per sub-query.
+
+    With embed_fn, all sub-queries are embedded in ONE batch call first and
+    search_fn(sub_query, embedding) is called; otherwise search_fn(sub_query).
+    Searches are I/O bound (vector DB / HTTP calls), so threads overlap them and the
+    total latency is close to the slowest single search instead of the sum.
+    """
+    if not sub_queries:
+        return []
+    args = [list(sub_queries)]
+    if embed_fn is not None:
+        args.append(list(embed_fn(list(sub_queries))))
+
+    if executor is not None:
+        return list(executor.map(search_fn, *args))
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(sub_queries))) as pool:
+        return list(pool.map(search_fn, *args))
+
+def multi_query_search(original_query: str, search_fn: Callable, embed_fn: Optional[Callable] = None, top_n: int = 5):
+    """
+    Sub-queries -> concurrent fan-out search -> RRF merge.
+    The original query is searched too, so expansion can only add recall.
+    """
+    sub_queries = [original_query] + [q for q in generate_sub_queries(original_query) if q != original_query]
+    return reciprocal_rank_fusion(fan_out_search(sub_queries, search_fn, embed_fn), top_n=top_n)
 
 if __name__ == "__main__":
     generate_sub_queries("Tell me about RAG concepts")
+
+    # Mock search with 200ms latency per call: 4 queries finish in ~0.2s instead of ~0.8s
+    corpus = {
+        "doc_rag": "RAG grants LLMs access to external data.",
+        "doc_vec": "Vector databases store embeddings for similarity search.",
+        "doc_llm": "LLMs generate text from a prompt.",
+    }
+    def mock_search(query):
+        time.sleep(0.2)
+        words = set(query.lower().split())
+        hits = [(chunk_id, doc) for chunk_id, doc in corpus.items() if words & set(doc.lower().split())]
+        return hits or [("doc_llm", corpus["doc_llm"])]
+
+    started = time.perf_counter()
+    merged = multi_query_search("Tell me about RAG concepts", mock_search)
+    print(f"Fan-out + RRF in {time.perf_counter() - started:.2f}s:")
+    for chunk_id, document, score in merged:
+        print(f"  {score:.4f} | {chunk_id} | {document}")
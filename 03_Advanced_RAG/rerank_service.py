@@ -0,0 +1,165 @@
+"""
+Cross-Encoder reranking service with dynamic batching and a score cache.
+
+Calling reranker.predict(pairs) once per query leaves the model under-used:
+small batches, and a lot of padding when a short and a long document share a
+batch. This service:
+
+1. Collects (query, doc) pairs from concurrent callers into micro-batches,
+   waiting at most `max_wait_ms` for a batch to fill up.
+2. Sorts pending pairs by length so each model batch holds similar-sized
+   inputs (less padding).
+3. Keeps an LRU cache of (query_hash, doc_hash) -> score, so repeated queries
+   and overlapping candidate lists skip inference.
+"""
+
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def word_count_length(query, doc):
+    # Cheap proxy for token length; pass the model tokenizer as length_fn for exact counts
+    return len(query.split()) + len(doc.split())
+
+
+class RerankService:
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5, cache_size=10_000, length_fn=word_count_length):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self.length_fn = length_fn
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "pairs": 0, "cache_hits": 0, "model_calls": 0, "pairs_scored": 0}
+
+        self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self._worker.start()
+
+    # --- Public API ---
+    def submit(self, query, docs):
+        """
+        Returns a Future that resolves to one score per doc (same order as docs).
+        """
+        future = Future()
+        keys = [(text_hash(query), text_hash(doc)) for doc in docs]
+        self._count("requests", 1)
+        self._count("pairs", len(docs))
+
+        # Fast path: everything already cached, no need to wait for a batch
+        cached = self._cache_get_many(keys)
+        if all(score is not None for score in cached):
+            self._count("cache_hits", len(keys))
+            future.set_result(cached)
+            return future
+
+        self._requests.put((query, docs, keys, future))
+        return future
+
+    def rerank(self, query, docs, top_k=None):
+        scores = self.submit(query, docs).result()
+        ranked = sorted(zip(docs, scores), key=lambda x: x[1], reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def close(self):
+        self._requests.put(None)
+        self._worker.join()
+
+    def _count(self, name, n):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    # --- Cache ---
+    def _cache_get_many(self, keys):
+        with self._cache_lock:
+            scores = []
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+            return scores
+
+    def _cache_put_many(self, items):
+        with self._cache_lock:
+            for key, score in items:
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- Batching worker ---
+    def _collect_batch(self, first):
+        # Keep pulling requests until the batch is full or the latency window closes
+        batch = [first]
+        n_pairs = len(first[1])
+        deadline = time.monotonic() + self.max_wait
+        while n_pairs < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._requests.put(None)  # Let the main loop see the shutdown signal
+                break
+            batch.append(request)
+            n_pairs += len(request[1])
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+            batch = self._collect_batch(first)
+            try:
+                self._score_batch(batch)
+            except Exception as e:
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _score_batch(self, batch):
+        # 1. Resolve what the cache already knows, de-duplicating pairs across requests
+        known = {}
+        missing = {}
+        for query, docs, keys, _ in batch:
+            for doc, key, score in zip(docs, keys, self._cache_get_many(keys)):
+                if score is not None:
+                    known[key] = score
+                    self._count("cache_hits", 1)
+                elif key not in missing:
+                    missing[key] = (query, doc)
+
+        # 2. Length bucketing: sorted by length, each model batch holds similar-sized pairs
+        pending = sorted(missing.items(), key=lambda item: self.length_fn(*item[1]))
+        for start in range(0, len(pending), self.max_batch_size):
+            chunk = pending[start:start + self.max_batch_size]
+            scores = self.model.predict([list(pair) for _, pair in chunk], batch_size=len(chunk))
+            self._count("model_calls", 1)
+            self._count("pairs_scored", len(chunk))
+            scored = [(key, float(score)) for (key, _), score in zip(chunk, scores)]
+            known.update(scored)
+            self._cache_put_many(scored)
+
+        # 3. Answer every caller in its own doc order
+        for _, _, keys, future in batch:
+            future.set_result([known[key] for key in keys])
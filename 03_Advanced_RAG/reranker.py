@@ -1,5 +1,13 @@
 from sentence_transformers import CrossEncoder
 import chromadb
+from chromadb.utils import embedding_functions
+from concurrent.futures import ThreadPoolExecutor
+from rerank_service import RerankService
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "02_Intermediate_RAG"))
+from semantic_cache import SemanticCache, file_version
 
 # 1. Setup
 client = chromadb.PersistentClient(path="../02_Intermediate_RAG/chroma_db_data")
@@ -10,28 +18,54 @@ collection = client.get_collection("demo_collection")
 print("Loading Cross-Encoder model...")
 reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
 
+# Shared service: batches pairs from concurrent queries and caches scores
+rerank_service = RerankService(reranker, max_batch_size=32, max_wait_ms=5)
+
+# Whole-pipeline result cache: a repeated or paraphrased query skips retrieval AND re-ranking.
+# Cache keys use the same default embedding model as the collection, so the
+# query embedding is computed once and reused for retrieval on a miss.
+query_cache = SemanticCache(
+    embedding_functions.DefaultEmbeddingFunction(),
+    threshold=0.95,
+    version_fn=file_version("../02_Intermediate_RAG/chroma_db_data/demo_collection_manifest.json"),
+)
+
 def retrieve_and_rerank(query, top_k_retrieve=10, top_k_rerank=3):
     print(f"\n--- Processing: '{query}' ---")
     
+    top_docs, hit = query_cache.get_or_compute(
+        query,
+        lambda embedding: _retrieve_and_rerank(query, embedding, top_k_retrieve, top_k_rerank),
+        params=(top_k_retrieve, top_k_rerank),
+    )
+    if hit:
+        print("(served from the semantic cache)")
+    
+    print(f"Top {top_k_rerank} after Re-ranking:")
+    for doc, score in top_docs:
+        print(f"  Score: {score:.4f} | Content: {doc}")
+    return top_docs
+
+def _retrieve_and_rerank(query, query_embedding, top_k_retrieve, top_k_rerank):
     # 1. Initial High-Recall Retrieval (fetching more docs than needed)
-    results = collection.query(query_texts=[query], n_results=top_k_retrieve)
+    results = collection.query(query_embeddings=[query_embedding], n_results=top_k_retrieve)
     retrieved_docs = results["documents"][0]
     
     print(f"Initial Retrieval: {len(retrieved_docs)} documents")
     
     # 2. Re-rank
-    # Create pairs of [query, doc]
-    pairs = [[query, doc] for doc in retrieved_docs]
-    scores = reranker.predict(pairs)
-    
-    # Sort by re-ranker score
-    scored_docs = sorted(list(zip(retrieved_docs, scores)), key=lambda x: x[1], reverse=True)
-    
-    print(f"Top {top_k_rerank} after Re-ranking:")
-    for doc, score in scored_docs[:top_k_rerank]:
-        print(f"  Score: {score:.4f} | Content: {doc}")
+    # Pairs of [query, doc] are scored by the shared service (batched + cached)
+    scored_docs = rerank_service.rerank(query, retrieved_docs)
+    return scored_docs[:top_k_rerank]
 
 if __name__ == "__main__":
     retrieve_and_rerank("What is the transformer architecture?")
     # Even if initial retrieval puts "Python" docs high due to some keyword overlap,
     # the re-ranker should push the specific "Transformer" doc to the top.
+    
+    # Concurrent queries share micro-batches; the repeated query is served from the cache.
+    queries = ["What is RAG?", "Explain deep learning", "What is RAG?"]
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        list(pool.map(retrieve_and_rerank, queries))
+    print(f"\nRerank service stats: {rerank_service.stats}")
+    print(f"Query cache stats: {query_cache.stats}")
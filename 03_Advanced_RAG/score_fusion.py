@@ -0,0 +1,92 @@
+"""
+Vectorized score fusion for hybrid search.
+
+Every retriever hands over its results for a batch of queries as two
+(n_queries x k) arrays: row numbers (-1 = empty slot) and raw scores, sorted
+best-first. Fusion then runs over whole matrices instead of Python dicts.
+
+Methods:
+- "rrf":    Reciprocal Rank Fusion, 1 / (rrf_k + rank). Ignores raw scores entirely.
+- "minmax": scale each retriever's scores to [0, 1] per query, then weighted sum.
+- "zscore": standardize each retriever's scores per query, then weighted sum.
+
+A document missing from one retriever's list gets that retriever's lowest
+normalized score for the query (0 for "rrf" and "minmax").
+"""
+
+import numpy as np
+
+FUSION_METHODS = ("rrf", "minmax", "zscore")
+
+
+def normalize_scores(rows, scores, method, rrf_k=60):
+    valid = rows >= 0
+    if method == "rrf":
+        ranks = np.arange(1, rows.shape[1] + 1, dtype=np.float64)
+        return np.where(valid, 1.0 / (rrf_k + ranks), 0.0)
+
+    counts = np.maximum(valid.sum(axis=1, keepdims=True), 1)
+    if method == "minmax":
+        low = np.where(valid, scores, np.inf).min(axis=1, keepdims=True)
+        high = np.where(valid, scores, -np.inf).max(axis=1, keepdims=True)
+        spread = high - low
+        # A single hit (or all ties) counts as a perfect match
+        normalized = np.where(spread > 0, (scores - low) / np.where(spread > 0, spread, 1.0), 1.0)
+    elif method == "zscore":
+        mean = np.where(valid, scores, 0.0).sum(axis=1, keepdims=True) / counts
+        var = np.where(valid, (scores - mean) ** 2, 0.0).sum(axis=1, keepdims=True) / counts
+        std = np.sqrt(var)
+        normalized = np.where(std > 0, (scores - mean) / np.where(std > 0, std, 1.0), 0.0)
+    else:
+        raise ValueError(f"Unknown fusion method: {method}. Use one of {FUSION_METHODS}")
+    return np.where(valid, normalized, 0.0)
+
+
+def fuse_scores(sources, weights, n_rows, k, method="rrf", rrf_k=60):
+    """
+    Fuses any number of (rows, scores) sources for the same batch of queries.
+
+    Returns (fused_rows, fused_scores), both (n_queries x k), best-first,
+    with -1 / 0.0 in empty slots.
+    """
+    n_queries = sources[0][0].shape[0]
+    query_index = np.arange(n_queries)[:, None]
+
+    all_keys, all_contrib = [], []
+    floor = np.zeros(n_queries)
+    for (rows, scores), weight in zip(sources, weights):
+        normalized = normalize_scores(rows, scores, method, rrf_k=rrf_k)
+        valid = rows >= 0
+        # z-scores can be negative: shift so "absent" is worth 0 and add the floor back at the end
+        source_floor = np.zeros(n_queries)
+        if method == "zscore":
+            lowest = np.where(valid, normalized, np.inf).min(axis=1)
+            source_floor = np.where(np.isfinite(lowest), lowest, 0.0)
+        floor += weight * source_floor
+
+        # (query, row) pairs encoded as one integer so duplicates can be summed
+        keys = query_index * n_rows + rows
+        all_keys.append(keys[valid])
+        all_contrib.append((weight * (normalized - source_floor[:, None]))[valid])
+
+    fused_rows = np.full((n_queries, k), -1, dtype=np.int64)
+    fused_scores = np.zeros((n_queries, k))
+    keys = np.concatenate(all_keys)
+    if keys.size == 0:
+        return fused_rows, fused_scores
+
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(all_contrib))
+    queries, rows = np.divmod(unique_keys, n_rows)
+    totals = totals + floor[queries]
+
+    # Group by query, best score first inside each group, then keep the first k per group
+    order = np.lexsort((-totals, queries))
+    queries, rows, totals = queries[order], rows[order], totals[order]
+    group_start = np.searchsorted(queries, queries, side="left")
+    rank = np.arange(len(queries)) - group_start
+    keep = rank < k
+
+    fused_rows[queries[keep], rank[keep]] = rows[keep]
+    fused_scores[queries[keep], rank[keep]] = totals[keep]
+    return fused_rows, fused_scores
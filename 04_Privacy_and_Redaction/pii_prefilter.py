@@ -0,0 +1,66 @@
+"""
+Cheap PII prefilter in front of Presidio.
+
+`AnalyzerEngine.analyze` runs the whole spaCy pipeline (en_core_web_lg) on every
+text, even on chunks that cannot contain any of the requested entity types:
+no "@" means no email address, fewer than 7 digits means no phone number.
+
+Each entity type gets a compiled regex that matches a NECESSARY condition for
+that entity (a superset of what Presidio can find). A chunk that matches none of
+them for the requested types is skipped. The rest are analyzed in batches with
+BatchAnalyzerEngine, which feeds spaCy through `nlp.pipe`.
+
+The prefilter pays off most for pattern-based types (emails, phone numbers,
+card numbers). NER types such as PERSON only need a capitalized word, so they
+only rule out chunks with no capitals at all.
+"""
+
+import re
+
+# Necessary conditions, not detectors: false positives are fine, false negatives are not
+PREFILTERS = {
+    "EMAIL_ADDRESS": re.compile(r"@"),
+    "PHONE_NUMBER": re.compile(r"\d(?:[\s().+-]*\d){6}"),     # 7+ digits, separators allowed
+    "CREDIT_CARD": re.compile(r"\d(?:[\s-]*\d){12}"),          # 13+ digits
+    "US_SSN": re.compile(r"\d{3}[\s.-]?\d{2}[\s.-]?\d{4}"),
+    "IP_ADDRESS": re.compile(r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|[0-9a-fA-F]{0,4}:[0-9a-fA-F]{0,4}:"),
+    "URL": re.compile(r"[\w-]\.[a-zA-Z]{2,}|://"),
+    "IBAN_CODE": re.compile(r"[A-Z]{2}\d{2}"),
+    # spaCy NER entities: practically always capitalized
+    "PERSON": re.compile(r"[A-Z]"),
+    "LOCATION": re.compile(r"[A-Z]"),
+    "NRP": re.compile(r"[A-Z]"),
+}
+
+
+def may_contain(text, entities):
+    """
+    False only if `text` certainly contains none of `entities`.
+    Entity types without a prefilter are always assumed possible.
+    """
+    for entity in entities:
+        pattern = PREFILTERS.get(entity)
+        if pattern is None or pattern.search(text):
+            return True
+    return False
+
+
+def analyze_batch(batch_analyzer, texts, entities, language="en", batch_size=32):
+    """
+    Presidio results for every text ([] for texts the prefilter skipped).
+
+    `batch_analyzer` is a presidio_analyzer.BatchAnalyzerEngine; candidate texts
+    go through spaCy's `nlp.pipe` in batches of `batch_size`.
+    """
+    results = [[] for _ in texts]
+    candidates = [i for i, text in enumerate(texts) if may_contain(text, entities)]
+    if candidates:
+        analyzed = batch_analyzer.analyze_iterator(
+            [texts[i] for i in candidates],
+            language=language,
+            batch_size=batch_size,
+            entities=list(entities),
+        )
+        for i, found in zip(candidates, analyzed):
+            results[i] = found
+    return results
@@ -0,0 +1,143 @@
+"""
+Ingest-time PII verdicts stored in chunk metadata.
+
+Chunk text does not change after ingestion, so scanning every retrieved chunk
+with Presidio on every query repeats the same work forever. Instead each chunk
+is scanned ONCE and the verdict goes into its metadata:
+
+    pii_hash      sha256 of the chunk text the verdict belongs to
+    pii_version   policy version: entity set + analyzer version + spaCy model
+    pii_found     True / False
+    pii_entities  "EMAIL_ADDRESS,PHONE_NUMBER" (comma-separated, sorted)
+    pii_spans     JSON list of [entity_type, start, end, score]
+
+At query time a chunk is safe if its verdict matches the current policy version
+and text hash: a dictionary lookup, no spaCy. The vector query can also
+pre-filter with `safe_where(version)` so unsafe chunks are never returned.
+A chunk is rescanned only when its text or the policy version changed.
+
+Verdicts are written at ingest time: 02_Intermediate_RAG's DeltaIngestor runs a
+VerdictScanner on every chunk it upserts, so a re-ingested chunk keeps a
+current verdict. Annotate a collection that was ingested without one
+(only stale or missing verdicts are scanned):
+    python pii_verdicts.py --db ../02_Intermediate_RAG/chroma_db_data --collection demo_collection
+"""
+
+import argparse
+import hashlib
+import json
+from importlib import metadata as importlib_metadata
+
+from pii_prefilter import analyze_batch
+
+POLICY_ENTITIES = ["PHONE_NUMBER", "EMAIL_ADDRESS"]
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def policy_version(entities=POLICY_ENTITIES, model="en_core_web_lg"):
+    """
+    Changes whenever the entity set, the Presidio version or the spaCy model changes,
+    which invalidates every stored verdict.
+    """
+    try:
+        analyzer_version = importlib_metadata.version("presidio-analyzer")
+    except importlib_metadata.PackageNotFoundError:
+        analyzer_version = "unknown"
+    key = json.dumps([sorted(entities), analyzer_version, model])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+def verdict_metadata(text, results, version):
+    spans = sorted([r.entity_type, r.start, r.end, round(r.score, 3)] for r in results)
+    return {
+        "pii_hash": content_hash(text),
+        "pii_version": version,
+        "pii_found": bool(spans),
+        "pii_entities": ",".join(sorted({s[0] for s in spans})),
+        "pii_spans": json.dumps(spans),
+    }
+
+
+def scan_chunks(batch_analyzer, texts, version, entities=POLICY_ENTITIES):
+    """
+    One verdict metadata dict per text (prefiltered, batched Presidio pass).
+    """
+    all_results = analyze_batch(batch_analyzer, texts, entities)
+    return [verdict_metadata(text, results, version) for text, results in zip(texts, all_results)]
+
+
+class VerdictScanner:
+    """
+    DeltaIngestor annotate_fn: verdict metadata for each chunk being upserted.
+    `version` goes into the ingest manifest, so a policy change rescans every chunk.
+    """
+
+    def __init__(self, batch_analyzer, entities=POLICY_ENTITIES, version=None):
+        self.batch_analyzer = batch_analyzer
+        self.entities = entities
+        self.version = version or policy_version(entities)
+
+    def __call__(self, texts):
+        return scan_chunks(self.batch_analyzer, texts, self.version, self.entities)
+
+
+def lookup_verdict(text, metadata, version):
+    """
+    True = contains PII, False = clean, None = no valid verdict (must be scanned).
+    """
+    if not metadata or metadata.get("pii_version") != version:
+        return None
+    if metadata.get("pii_hash") != content_hash(text):
+        return None  # Text was replaced without refreshing the verdict
+    return bool(metadata["pii_found"])
+
+
+def safe_where(version):
+    # Chroma `where` pre-filter: only chunks with a current, clean verdict
+    return {"$and": [{"pii_version": version}, {"pii_found": False}]}
+
+
+def annotate_collection(collection, batch_analyzer, version, entities=POLICY_ENTITIES, page_size=1000):
+    """
+    Writes verdicts into a Chroma collection's metadata. Chunks whose verdict is
+    already current are skipped, so re-running after ingestion only scans new chunks.
+    """
+    counts = {"scanned": 0, "current": 0, "with_pii": 0}
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        stale = [
+            i for i, (text, meta) in enumerate(zip(page["documents"], page["metadatas"]))
+            if lookup_verdict(text, meta, version) is None
+        ]
+        counts["current"] += len(page["ids"]) - len(stale)
+        if stale:
+            verdicts = scan_chunks(batch_analyzer, [page["documents"][i] for i in stale], version, entities)
+            collection.update(
+                ids=[page["ids"][i] for i in stale],
+                metadatas=[{**(page["metadatas"][i] or {}), **v} for i, v in zip(stale, verdicts)],
+            )
+            counts["scanned"] += len(stale)
+            counts["with_pii"] += sum(v["pii_found"] for v in verdicts)
+        offset += len(page["ids"])
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store PII verdicts in a Chroma collection's metadata")
+    parser.add_argument("--db", default="../02_Intermediate_RAG/chroma_db_data")
+    parser.add_argument("--collection", default="demo_collection")
+    args = parser.parse_args()
+
+    import chromadb
+    from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine
+
+    collection = chromadb.PersistentClient(path=args.db).get_collection(args.collection)
+    batch_analyzer = BatchAnalyzerEngine(analyzer_engine=AnalyzerEngine())
+    version = policy_version()
+    print(f"Policy version {version}: {annotate_collection(collection, batch_analyzer, version)}")
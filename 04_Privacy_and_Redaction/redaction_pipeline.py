@@ -1,6 +1,11 @@
-from presidio_analyzer import AnalyzerEngine
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine
 from presidio_anonymizer import AnonymizerEngine
 from presidio_anonymizer.entities import OperatorConfig
+from pii_prefilter import analyze_batch
 
 # Prerequisite:
 # python -m spacy download en_core_web_lg
@@ -12,35 +17,78 @@ except OSError:
     print("Spacy model not found. Please run: python -m spacy download en_core_web_lg")
     exit(1)
     
+batch_analyzer = BatchAnalyzerEngine(analyzer_engine=analyzer)
 anonymizer = AnonymizerEngine()
 
+ENTITIES = ["PHONE_NUMBER", "EMAIL_ADDRESS", "PERSON"]
+
+# Define how to replace specific entities
+OPERATORS = {
+    "PERSON": OperatorConfig("replace", {"new_value": "<PERSON>"}),
+    "PHONE_NUMBER": OperatorConfig("replace", {"new_value": "<PHONE_REDACTED>"}),
+    "EMAIL_ADDRESS": OperatorConfig("replace", {"new_value": "<EMAIL_REDACTED>"}),
+}
+
 def redact_text(text: str):
     print(f"\nOriginal: {text}")
     
     # 1. Analyze (Detect PII)
-    results = analyzer.analyze(text=text, entities=["PHONE_NUMBER", "EMAIL_ADDRESS", "PERSON"], language='en')
+    results = analyzer.analyze(text=text, entities=ENTITIES, language='en')
     print(f"Detected {len(results)} PII entities.")
     
     # 2. Anonymize (Redact)
-    # Define how to replace specific entities
-    operators = {
-        "PERSON": OperatorConfig("replace", {"new_value": "<PERSON>"}),
-        "PHONE_NUMBER": OperatorConfig("replace", {"new_value": "<PHONE_REDACTED>"}),
-        "EMAIL_ADDRESS": OperatorConfig("replace", {"new_value": "<EMAIL_REDACTED>"}),
-    }
-    
     anonymized_result = anonymizer.anonymize(
         text=text,
         analyzer_results=results,
-        operators=operators
+        operators=OPERATORS
     )
     
     print(f"Redacted: {anonymized_result.text}")
     return anonymized_result.text
 
+def redact_batch(texts, entities=ENTITIES, batch_size=32):
+    """
+    Redacts many chunks at once. Chunks the regex prefilter rules out skip spaCy
+    entirely; the rest go through nlp.pipe in batches.
+    """
+    all_results = analyze_batch(batch_analyzer, texts, entities, batch_size=batch_size)
+    return [
+        anonymizer.anonymize(text=text, analyzer_results=results, operators=OPERATORS).text if results else text
+        for text, results in zip(texts, all_results)
+    ]
+
+def redact_corpus(texts, workers=None, slice_size=512, batch_size=32):
+    """
+    Corpus-scale redaction: slices of chunks are redacted in parallel processes
+    (spaCy holds the GIL, so threads would not help). Output order matches input.
+    Each worker loads its own spaCy model when it imports this module.
+    """
+    workers = workers or os.cpu_count()
+    slices = [texts[i:i + slice_size] for i in range(0, len(texts), slice_size)]
+    if workers <= 1 or len(slices) <= 1:
+        return [text for chunk in slices for text in redact_batch(chunk, batch_size=batch_size)]
+    redacted = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in pool.map(redact_batch, slices, [ENTITIES] * len(slices), [batch_size] * len(slices)):
+            redacted.extend(chunk)
+    return redacted
+
 if __name__ == "__main__":
     # Example 1
     redact_text("Contact John Doe at 555-0199 or via email john.doe@example.com for the secret codes.")
     
     # Example 2
     redact_text("The patient Alice Smith was admitted on Monday.")
+    
+    # Batch / corpus redaction: most chunks are clean and never reach spaCy
+    corpus = [
+        "call 555-0199 after five",
+        "the quarterly numbers look fine",
+        "Contact John Doe at john.doe@example.com",
+        "no pii in this lowercase chunk",
+    ] * 250
+    started = time.perf_counter()
+    redacted = redact_corpus(corpus, workers=2)
+    print(f"\nRedacted {len(corpus)} chunks in {time.perf_counter() - started:.2f}s:")
+    for line in redacted[:4]:
+        print(f"  {line}")
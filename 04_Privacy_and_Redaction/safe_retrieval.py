@@ -1,11 +1,20 @@
-from presidio_analyzer import AnalyzerEngine
-import random
+from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine
+from pii_prefilter import analyze_batch
+from pii_verdicts import POLICY_ENTITIES, lookup_verdict, policy_version, safe_where, scan_chunks
 
 # Scenario: We have retrieved chunks from a DB, but some might accidentally contain raw PII 
 # (perhaps they were ingested before the redaction policy was active).
 # We must filter them out before sending to the LLM (Safe Retrieval).
+#
+# Chunks are scanned once at ingest time (pii_verdicts.py) and the verdict is kept in
+# their metadata. At query time the check is a metadata lookup; Presidio only runs for
+# chunks whose verdict is missing or from an older policy version.
 
 analyzer = AnalyzerEngine()
+batch_analyzer = BatchAnalyzerEngine(analyzer_engine=analyzer)
+
+BLOCKED_ENTITIES = POLICY_ENTITIES
+POLICY_VERSION = policy_version(BLOCKED_ENTITIES)
 
 retrieved_chunks = [
     "The project deadline is next Friday.",
@@ -14,14 +23,23 @@ retrieved_chunks = [
     "Send the report to admin@corp.com immediately."
 ]
 
-def check_safety(chunks):
+def check_safety(chunks, metadatas=None):
     safe_chunks = []
     print("--- Checking retrieved chunks for PII leakage ---")
     
-    for chunk in chunks:
-        results = analyzer.analyze(text=chunk, entities=["PHONE_NUMBER", "EMAIL_ADDRESS"], language='en')
-        
-        if results:
+    # 1. O(1) per chunk: the verdict stored at ingest time
+    metadatas = metadatas or [None] * len(chunks)
+    verdicts = [lookup_verdict(chunk, meta, POLICY_VERSION) for chunk, meta in zip(chunks, metadatas)]
+    
+    # 2. Slow path, only for chunks without a current verdict: one batched, prefiltered scan
+    stale = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    if stale:
+        print(f"(Rescanning {len(stale)} chunks without a current verdict)")
+        for i, results in zip(stale, analyze_batch(batch_analyzer, [chunks[i] for i in stale], BLOCKED_ENTITIES)):
+            verdicts[i] = bool(results)
+    
+    for chunk, has_pii in zip(chunks, verdicts):
+        if has_pii:
             print(f"[BLOCKED] Chunk contains PII: '{chunk}'")
         else:
             print(f"[SAFE]    '{chunk}'")
@@ -31,4 +49,16 @@ def check_safety(chunks):
     return safe_chunks
 
 if __name__ == "__main__":
+    # Without verdicts every chunk is scanned (the old behaviour)
     check_safety(retrieved_chunks)
+    
+    # Ingest time: scan once, store the verdicts next to the chunks
+    chunk_metadatas = scan_chunks(batch_analyzer, retrieved_chunks, POLICY_VERSION)
+    
+    # Query time: pure metadata lookups, spaCy never runs
+    print()
+    check_safety(retrieved_chunks, chunk_metadatas)
+    
+    # Or let the vector DB drop unsafe chunks before they are even returned:
+    # collection.query(query_texts=[...], n_results=5, where=safe_where(POLICY_VERSION))
+    print(f"\nPre-filter for the vector query: {safe_where(POLICY_VERSION)}")
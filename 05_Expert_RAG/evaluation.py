@@ -1,23 +1,50 @@
-import os
-import pandas as pd
-from datasets import Dataset
-from ragas import evaluate
-from ragas.metrics import (
-    faithfulness,
-    answer_relevancy,
-    context_precision,
-    context_recall,
-)
-from ragas.metrics.critique import harmfulness
+"""
+Evaluating RAG strategies with LLM-judged metrics (Ragas).
+
+A full evaluation makes one judge call per (strategy, sample, metric), so it is
+slow and costs money. This script keeps reruns cheap:
+
+- Cache: every metric score is stored in SQLite, keyed by
+  (sample hash, metric, judge model). A rerun only scores samples that changed,
+  and an interrupted run resumes where it stopped, because each score is
+  committed as soon as it arrives.
+- Concurrency: samples from ALL strategies are scored in parallel by a thread
+  pool (`--workers`). Identical samples shared by strategies are scored once.
+- Rate limit: one sample costs several LLM requests (Ragas extracts statements,
+  asks for verdicts, generates questions, ...), so `--rate-limit` is enforced
+  per LLM request inside the judge, not per sample, to respect the API's quota.
+- Pluggable judge: `RagasJudge` calls Ragas + OpenAI (and is only imported when
+  used). `StubJudge` scores locally with word overlap, with no API key, so the
+  pipeline can be exercised in tests and demos.
+
+    python evaluation.py                                   # Ragas + OpenAI
+    python evaluation.py --judge stub                      # Offline
+    python evaluation.py --workers 8 --rate-limit 5 --cache eval_cache.db
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # NOTE: In a real environment, ensure OPENAI_API_KEY is set
 # on os.environ for Ragas/LangChain to work.
 
+METRICS = ["faithfulness", "answer_relevancy", "context_precision", "context_recall", "harmfulness"]
+
+
 def create_evaluation_dataset(data_samples):
     """
     Converts a list of dicts into a HuggingFace Dataset compatible with Ragas.
     Expected keys: 'question', 'answer', 'contexts', 'ground_truth'
     """
+    from datasets import Dataset
+
     data = {
         'question': [x['question'] for x in data_samples],
         'answer': [x['answer'] for x in data_samples],
@@ -26,113 +53,336 @@ def create_evaluation_dataset(data_samples):
     }
     return Dataset.from_dict(data)
 
-def evaluate_strategy(strategy_name: str, dataset: Dataset):
+
+def sample_hash(sample):
     """
-    Runs Ragas evaluation on a given dataset for a specific strategy.
+    Stable hash of everything the judge sees: any edit to the sample invalidates its scores.
     """
-    print(f"\n--- Evaluating Strategy: {strategy_name} ---")
-    
-    # Define metrics to track
-    metrics = [
-        faithfulness,
-        answer_relevancy,
-        context_precision,
-        context_recall,
-        harmfulness
-    ]
-    
-    # Run evaluation
-    # raise_exceptions=False prevents crash on individual API failures
-    results = evaluate(
-        dataset=dataset,
-        metrics=metrics,
-        raise_exceptions=False
-    )
-    
-    print(f"Results for {strategy_name}:")
-    print(results)
-    return results
+    payload = {key: sample[key] for key in ("question", "answer", "contexts", "ground_truth")}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
 
-def main():
-    # 1. Define Evaluation Data (Golden Dataset)
-    # Start with a predefined set of questions and ground truths.
-    # In a real scenario, 'contexts' and 'answer' would come from your RAG pipeline.
-    
-    # Strategy A: Naive RAG (Simulated outputs - retrieval might be noisy)
-    strategy_a_samples = [
-        {
-            "question": "What is Retrieval-Augmented Generation?",
-            "answer": "RAG is a method to improve LLM accuracy by retrieving external data.",
-            "contexts": [
-                "Retrieval-Augmented Generation (RAG) is a technique...",
-                "The sky is blue.", # Irrelevant context -> lower precision
-            ],
-            "ground_truth": "Retrieval-Augmented Generation (RAG) retrieves data to augment generation."
-        },
-        {
-            "question": "How do you install LangChain?",
-            "answer": "You can install it using pip or conda.",
-            "contexts": [
-                "pip install langchain",
-                "conda install langchain -c conda-forge"
-            ],
-            "ground_truth": "Use 'pip install langchain' or 'conda install langchain -c conda-forge'."
+
+# --- Judges: score(sample, metric names) -> {metric: float} ---
+
+class RagasJudge:
+    """
+    LLM-as-a-judge through Ragas. `model` names the judge in the cache; pass the
+    matching LangChain `llm` (and `embeddings`), or leave them unset for Ragas' defaults.
+    `rate_limiter` is acquired before every chat/completion request Ragas sends
+    (embedding requests are not counted).
+    """
+
+    def __init__(self, model="ragas-default", llm=None, embeddings=None, rate_limiter=None):
+        # Lazy import: the stub judge must work without ragas/datasets installed
+        from ragas import evaluate
+        from ragas.metrics import answer_relevancy, context_precision, context_recall, faithfulness
+        from ragas.metrics.critique import harmfulness
+
+        self.model = model
+        self.llm = llm
+        self.embeddings = embeddings
+        self._callbacks = [rate_limit_callback(rate_limiter)] if rate_limiter else None
+        self._evaluate = evaluate
+        self._metrics = {
+            "faithfulness": faithfulness,
+            "answer_relevancy": answer_relevancy,
+            "context_precision": context_precision,
+            "context_recall": context_recall,
+            "harmfulness": harmfulness,
         }
-    ]
-
-    # Strategy B: Advanced RAG (Simulated outputs - better retrieval & reranking)
-    strategy_b_samples = [
-        {
-            "question": "What is Retrieval-Augmented Generation?",
-            "answer": "Retrieval-Augmented Generation (RAG) is an architecture that fetches relevant documents to ground the LLM's answers.",
-            "contexts": [
-                "Retrieval-Augmented Generation (RAG) is a technique...",
-                "It combines parametric and non-parametric memory." # More relevant
-            ],
-            "ground_truth": "Retrieval-Augmented Generation (RAG) retrieves data to augment generation."
-        },
-        {
-            "question": "How do you install LangChain?",
-            "answer": "To install LangChain, run `pip install langchain` or use Conda.",
-            "contexts": [
-                "pip install langchain",
-                "conda install langchain -c conda-forge",
-                "Installation guide for LangChain..."
-            ],
-            "ground_truth": "Use 'pip install langchain' or 'conda install langchain -c conda-forge'."
+
+    def score(self, sample, metrics):
+        # One Ragas call per sample covers all of its missing metrics
+        kwargs = {"llm": self.llm, "embeddings": self.embeddings, "callbacks": self._callbacks}
+        results = self._evaluate(
+            dataset=create_evaluation_dataset([sample]),
+            metrics=[self._metrics[m] for m in metrics],
+            raise_exceptions=False,  # Failed calls come back as NaN and are retried on the next run
+            **{key: value for key, value in kwargs.items() if value is not None},
+        )
+        row = results.to_pandas().iloc[0]
+        return {m: float(row[m]) for m in metrics}
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class StubJudge:
+    """
+    Offline judge for tests: word-overlap proxies of the Ragas metrics, deterministic and free.
+    `latency_s` simulates an API round-trip, one per metric like an LLM judge's requests.
+    """
+
+    def __init__(self, model="stub-overlap", latency_s=0.0, rate_limiter=None):
+        self.model = model
+        self.latency_s = latency_s
+        self.rate_limiter = rate_limiter
+
+    def score(self, sample, metrics):
+        for _ in metrics:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            time.sleep(self.latency_s)
+        question, answer, truth = _words(sample["question"]), _words(sample["answer"]), _words(sample["ground_truth"])
+        contexts = [_words(c) for c in sample["contexts"]]
+        context_words = set().union(*contexts)
+
+        def coverage(words, source):
+            return len(words & source) / len(words) if words else 0.0
+
+        proxies = {
+            "faithfulness": coverage(answer, context_words),
+            "answer_relevancy": coverage(question, answer),
+            "context_precision": sum(bool(c & truth) for c in contexts) / len(contexts) if contexts else 0.0,
+            "context_recall": coverage(truth, context_words),
+            "harmfulness": 0.0,
         }
-    ]
+        return {m: proxies[m] for m in metrics}
+
+
+# --- Persistence and throttling ---
+
+class ScoreCache:
+    """
+    SQLite store of per-sample metric scores, safe to share between worker threads.
+    """
+
+    def __init__(self, path="eval_cache.db"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "sample_hash TEXT, metric TEXT, judge_model TEXT, score REAL, created_at REAL, "
+            "PRIMARY KEY (sample_hash, metric, judge_model))"
+        )
+        self._db.commit()
+
+    def get(self, sample_hash, judge_model):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT metric, score FROM scores WHERE sample_hash = ? AND judge_model = ?",
+                (sample_hash, judge_model),
+            ).fetchall()
+        return dict(rows)
+
+    def put(self, sample_hash, judge_model, scores):
+        now = time.time()
+        rows = [
+            (sample_hash, metric, judge_model, value, now)
+            for metric, value in scores.items()
+            if value == value  # NaN = failed judge call: not cached, so it is retried
+        ]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()  # Committed per sample: an interrupted run keeps everything scored so far
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RateLimiter:
+    """
+    Spaces out LLM requests to at most `per_second`, across all threads.
+    """
 
-    # 2. Convert to Datasets
-    ds_a = create_evaluation_dataset(strategy_a_samples)
-    ds_b = create_evaluation_dataset(strategy_b_samples)
+    def __init__(self, per_second=None):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
 
-    # 3. specific RAGAS evaluation logic - Validation
-    # NOTE: This step triggers actual LLM calls via Ragas.
-    # Ensure you have credits/keys.
-    
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def rate_limit_callback(limiter):
+    """
+    LangChain callback that waits on `limiter` before each LLM request is sent.
+    Ragas passes its callbacks down to every request of every metric.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class RateLimitCallback(BaseCallbackHandler):
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            limiter.acquire()
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            limiter.acquire()
+
+    return RateLimitCallback()
+
+
+# --- Evaluation ---
+
+def evaluate_strategies(strategies, judge, cache, metrics=METRICS, max_workers=4):
+    """
+    Scores every sample of every strategy. `strategies` maps name -> list of samples.
+    Returns one row per (strategy, sample): {"strategy", "question", metric: score, ...}.
+    Only (sample, metric) pairs missing from the cache reach the judge.
+    """
+    # 1. Look up cached scores; identical samples across strategies share one job
+    scores, pending = {}, {}
+    for samples in strategies.values():
+        for sample in samples:
+            key = sample_hash(sample)
+            if key in scores:
+                continue
+            scores[key] = cache.get(key, judge.model)
+            missing = [m for m in metrics if m not in scores[key]]
+            if missing:
+                pending[key] = (sample, missing)
+
+    n_cached = sum(len(s) for s in scores.values())
+    print(f"{len(scores)} unique samples, {n_cached} scores cached, {len(pending)} samples to score with '{judge.model}'")
+
+    # 2. Score the rest concurrently, persisting each sample as soon as it is done
+    def score_one(key, sample, missing):
+        result = judge.score(sample, missing)
+        cache.put(key, judge.model, result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(score_one, key, sample, missing): key for key, (sample, missing) in pending.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            try:
+                scores[key].update(future.result())
+            except Exception as e:
+                # Left unscored: the next run retries just this sample
+                print(f"[Error] Judge failed on sample {key[:8]}: {e}")
+            print(f"   scored {done}/{len(futures)}")
+
+    # 3. One row per (strategy, sample)
+    rows = []
+    for name, samples in strategies.items():
+        for sample in samples:
+            sample_scores = scores[sample_hash(sample)]
+            rows.append({"strategy": name, "question": sample["question"], **{m: sample_scores.get(m) for m in metrics}})
+    return rows
+
+
+def evaluate_strategy(strategy_name, samples, judge, cache, metrics=METRICS, **kwargs):
+    """
+    Evaluates a single strategy (see `evaluate_strategies`).
+    """
+    print(f"\n--- Evaluating Strategy: {strategy_name} ---")
+    return evaluate_strategies({strategy_name: samples}, judge, cache, metrics, **kwargs)
+
+
+def summarize(rows, metrics=METRICS):
+    """
+    Mean of each metric per strategy, ignoring samples the judge failed on.
+    """
+    summary = {}
+    for name in dict.fromkeys(row["strategy"] for row in rows):
+        summary[name] = {}
+        for m in metrics:
+            values = [row[m] for row in rows if row["strategy"] == name and row[m] is not None and row[m] == row[m]]
+            summary[name][m] = sum(values) / len(values) if values else float("nan")
+    return summary
+
+
+# 1. Define Evaluation Data (Golden Dataset)
+# Start with a predefined set of questions and ground truths.
+# In a real scenario, 'contexts' and 'answer' would come from your RAG pipeline.
+
+# Strategy A: Naive RAG (Simulated outputs - retrieval might be noisy)
+STRATEGY_A_SAMPLES = [
+    {
+        "question": "What is Retrieval-Augmented Generation?",
+        "answer": "RAG is a method to improve LLM accuracy by retrieving external data.",
+        "contexts": [
+            "Retrieval-Augmented Generation (RAG) is a technique...",
+            "The sky is blue.", # Irrelevant context -> lower precision
+        ],
+        "ground_truth": "Retrieval-Augmented Generation (RAG) retrieves data to augment generation."
+    },
+    {
+        "question": "How do you install LangChain?",
+        "answer": "You can install it using pip or conda.",
+        "contexts": [
+            "pip install langchain",
+            "conda install langchain -c conda-forge"
+        ],
+        "ground_truth": "Use 'pip install langchain' or 'conda install langchain -c conda-forge'."
+    }
+]
+
+# Strategy B: Advanced RAG (Simulated outputs - better retrieval & reranking)
+STRATEGY_B_SAMPLES = [
+    {
+        "question": "What is Retrieval-Augmented Generation?",
+        "answer": "Retrieval-Augmented Generation (RAG) is an architecture that fetches relevant documents to ground the LLM's answers.",
+        "contexts": [
+            "Retrieval-Augmented Generation (RAG) is a technique...",
+            "It combines parametric and non-parametric memory." # More relevant
+        ],
+        "ground_truth": "Retrieval-Augmented Generation (RAG) retrieves data to augment generation."
+    },
+    {
+        "question": "How do you install LangChain?",
+        "answer": "To install LangChain, run `pip install langchain` or use Conda.",
+        "contexts": [
+            "pip install langchain",
+            "conda install langchain -c conda-forge",
+            "Installation guide for LangChain..."
+        ],
+        "ground_truth": "Use 'pip install langchain' or 'conda install langchain -c conda-forge'."
+    }
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare RAG strategies with cached, concurrent LLM-judged metrics")
+    parser.add_argument("--judge", choices=["ragas", "stub"], default="ragas")
+    parser.add_argument("--model", help="Judge model name recorded in the cache")
+    parser.add_argument("--cache", default="eval_cache.db")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate-limit", type=float, default=None, help="Max LLM requests per second (a sample makes several)")
+    parser.add_argument("--output", default="rag_evaluation_comparison.csv")
+    args = parser.parse_args()
+
+    strategies = {"Naive RAG": STRATEGY_A_SAMPLES, "Advanced RAG": STRATEGY_B_SAMPLES}
+
+    # 2. Pick the judge
+    # NOTE: The Ragas judge triggers actual LLM calls. Ensure you have credits/keys.
+    limiter = RateLimiter(args.rate_limit) if args.rate_limit else None
+    try:
+        if args.judge == "ragas":
+            judge = RagasJudge(model=args.model or "ragas-default", rate_limiter=limiter)
+        else:
+            judge = StubJudge(model=args.model or "stub-overlap", rate_limiter=limiter)
+    except ImportError as e:
+        print(f"\n[Error] Could not load the Ragas judge: {e}")
+        print("Install `ragas` (and export `OPENAI_API_KEY`), or run with `--judge stub`.")
+        return
+
+    # 3. Score every strategy concurrently; cached scores are reused
+    cache = ScoreCache(args.cache)
     try:
-        results_a = evaluate_strategy("Naive RAG", ds_a)
-        results_b = evaluate_strategy("Advanced RAG + Rerank", ds_b)
-        
-        # 4. Compare Results
-        df_a = results_a.to_pandas()
-        df_a['strategy'] = 'Naive RAG'
-        
-        df_b = results_b.to_pandas()
-        df_b['strategy'] = 'Advanced RAG'
-        
-        comparison_df = pd.concat([df_a, df_b], ignore_index=True)
-        print("\n--- Comparative Analysis ---")
-        print(comparison_df[['strategy', 'faithfulness', 'answer_relevancy', 'context_precision', 'context_recall']].groupby('strategy').mean())
-        
-        # Export for visualization/reporting
-        comparison_df.to_csv("rag_evaluation_comparison.csv", index=False)
-        print("\nDetailed results saved to 'rag_evaluation_comparison.csv'")
-
-    except Exception as e:
-        print(f"\n[Error] Ragas evaluation failed (likely due to missing OpenAI Key/Dependencies): {e}")
-        print("Please ensure `OPENAI_API_KEY` is exported and `ragas` is installed.")
+        rows = evaluate_strategies(strategies, judge, cache, max_workers=args.workers)
+    finally:
+        cache.close()
+
+    # 4. Compare Results
+    print("\n--- Comparative Analysis ---")
+    for name, means in summarize(rows).items():
+        print(f"{name:<14} " + " ".join(f"{m}={value:.3f}" for m, value in means.items()))
+
+    # Export for visualization/reporting
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["strategy", "question", *METRICS])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\nDetailed results saved to '{args.output}'")
 
 if __name__ == "__main__":
     main()
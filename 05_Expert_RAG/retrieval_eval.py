@@ -0,0 +1,255 @@
+"""
+Offline retrieval evaluation: quality AND speed, no LLM needed.
+
+`evaluation.py` judges hand-written answers with Ragas + OpenAI. This harness
+instead runs a golden query set through the repo's REAL retrievers and reports:
+
+- recall@k, MRR and nDCG@k, computed on a (queries x k) relevance matrix with NumPy,
+- latency p50 / p95 / p99 per query and throughput (QPS),
+- the hit rate of the retriever's own caches (semantic query cache, re-rank
+  score cache), reported separately. Both caches are cleared before every pass
+  over the query set, so with --repeat each pass measures cold lookups.
+
+The report is written as JSON, so two runs (e.g. before/after a change) can be diffed.
+
+Retrievers are loaded lazily, only the ones you ask for:
+    simple_rag           01_Basic_RAG/simple_rag.py        retrieve_documents
+    query_vector_db      02_Intermediate_RAG/semantic_search.py
+    hybrid_search        03_Advanced_RAG/hybrid_search.py  (hybrid_search_batch, RRF)
+    retrieve_and_rerank  03_Advanced_RAG/reranker.py
+
+A golden set is a JSONL file with one {"query": ..., "relevant": [...]} per line.
+A retrieved chunk counts as relevant if its id equals an entry OR its text
+contains the entry (case-insensitive), so hashed chunk ids are not required.
+
+    python retrieval_eval.py --retrievers simple_rag hybrid_search --k 3
+    python retrieval_eval.py --retrievers query_vector_db --golden my_golden.jsonl --output report.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Golden sets for the demo corpora that ship with the repo
+GOLDEN_SETS = {
+    # 01_Basic_RAG knowledge_base
+    "simple_rag": [
+        {"query": "What is RAG?", "relevant": ["RAG stands for Retrieval-Augmented Generation"]},
+        {"query": "How does the retriever work?", "relevant": ["The retriever finds relevant documents"]},
+        {"query": "What does the generator do?", "relevant": ["The generator produces an answer"]},
+        {"query": "fine-tuning vs RAG", "relevant": ["Fine-tuning updates the model's weights"]},
+        {"query": "How is similarity measured?", "relevant": ["Vector embeddings are often used"]},
+    ],
+    # 02_Intermediate_RAG/ingestion.py demo_collection
+    "demo_collection": [
+        {"query": "What is RAG?", "relevant": ["Retrieval-augmented generation (RAG)"]},
+        {"query": "Tell me about neural networks", "relevant": ["Deep learning is part of", "Machine learning is a field"]},
+        {"query": "coding languages", "relevant": ["Python is a high-level"]},
+        {"query": "Attention Is All You Need paper", "relevant": ["The transformer architecture"]},
+        {"query": "methods that learn from data", "relevant": ["Machine learning is a field"]},
+    ],
+}
+
+
+@contextlib.contextmanager
+def _in_directory(path):
+    # The scripts use paths relative to their own folder (e.g. "./chroma_db_data")
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _load_module(folder, module_name):
+    folder = REPO_ROOT / folder
+    if str(folder) not in sys.path:
+        sys.path.insert(0, str(folder))
+    with _in_directory(folder), contextlib.redirect_stdout(io.StringIO()):
+        return importlib.import_module(module_name)
+
+
+def _simple_rag(k):
+    module = _load_module("01_Basic_RAG", "simple_rag")
+    return module, lambda q: [(str(d["id"]), d["content"]) for d in module.retrieve_documents(q, top_k=k)]
+
+
+def _query_vector_db(k):
+    module = _load_module("02_Intermediate_RAG", "semantic_search")
+
+    def search(q):
+        results = module.query_vector_db(q, n_results=k)
+        return list(zip(results["ids"][0], results["documents"][0]))
+    return module, search
+
+
+def _hybrid_search(k):
+    module = _load_module("03_Advanced_RAG", "hybrid_search")
+    return module, lambda q: [(doc_id, text) for doc_id, text, _ in module.hybrid_search_batch([q], k=k, method="rrf")[0]]
+
+
+def _retrieve_and_rerank(k):
+    module = _load_module("03_Advanced_RAG", "reranker")
+    everything = module.collection.get()
+    id_of = dict(zip(everything["documents"], everything["ids"]))  # The re-ranker returns texts only
+
+    def search(q):
+        top = module.retrieve_and_rerank(q, top_k_retrieve=max(10, k), top_k_rerank=k)
+        return [(id_of.get(text, ""), text) for text, _ in top]
+    return module, search
+
+
+# name -> (adapter factory, folder the script runs from, default golden set)
+RETRIEVERS = {
+    "simple_rag": (_simple_rag, "01_Basic_RAG", "simple_rag"),
+    "query_vector_db": (_query_vector_db, "02_Intermediate_RAG", "demo_collection"),
+    "hybrid_search": (_hybrid_search, "03_Advanced_RAG", "demo_collection"),
+    "retrieve_and_rerank": (_retrieve_and_rerank, "03_Advanced_RAG", "demo_collection"),
+}
+
+
+def load_golden(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def relevance_matrix(ranked_lists, golden, k):
+    """
+    (n_queries x k) int matrix: index of the golden entry matched at each rank,
+    -1 for irrelevant or empty slots. An entry only counts at its first rank.
+    """
+    matched = np.full((len(golden), k), -1, dtype=np.int64)
+    for q, (hits, item) in enumerate(zip(ranked_lists, golden)):
+        found = set()
+        for rank, (doc_id, text) in enumerate(hits[:k]):
+            text = (text or "").lower()
+            for j, relevant in enumerate(item["relevant"]):
+                if j not in found and (relevant == doc_id or relevant.lower() in text):
+                    matched[q, rank] = j
+                    found.add(j)
+                    break
+    return matched
+
+
+def ranking_metrics(matched, n_relevant, cutoffs):
+    """
+    recall@c, MRR@k and nDCG@c (binary gains) for every cutoff c, averaged over queries.
+    """
+    hits = (matched >= 0).astype(np.float64)
+    k = hits.shape[1]
+    n_relevant = np.maximum(np.asarray(n_relevant, dtype=np.float64), 1)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, np.inf)
+    metrics = {f"mrr@{k}": float(np.mean(1.0 / first_hit))}
+    for c in cutoffs:
+        dcg = (hits[:, :c] * discounts[:c]).sum(axis=1)
+        ideal_counts = np.minimum(n_relevant, c).astype(np.int64)
+        idcg = np.concatenate([[0.0], np.cumsum(discounts[:c])])[ideal_counts]
+        metrics[f"recall@{c}"] = float(np.mean(hits[:, :c].sum(axis=1) / n_relevant))
+        metrics[f"ndcg@{c}"] = float(np.mean(dcg / idcg))
+    return metrics
+
+
+# Caches a retriever module may hold: attribute -> (clear, (hits, lookups) from its stats)
+CACHES = {
+    "query_cache": (
+        lambda cache: cache.invalidate(),
+        lambda stats: (stats["exact_hits"] + stats["semantic_hits"], stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]),
+    ),
+    "rerank_service": (
+        lambda service: service.clear_cache(),
+        lambda stats: (stats["cache_hits"], stats["pairs"]),
+    ),
+}
+
+
+def _cache_counts(caches):
+    return {name: CACHES[name][1](dict(cache.stats)) for name, cache in caches.items()}
+
+
+def evaluate_retriever(name, golden=None, k=5, repeat=1):
+    factory, folder, default_golden = RETRIEVERS[name]
+    golden = golden or GOLDEN_SETS[default_golden]
+    module, search = factory(k)
+    caches = {attr: getattr(module, attr) for attr in CACHES if getattr(module, attr, None) is not None}
+
+    latencies, ranked_lists = [], []
+    elapsed = 0.0
+    before = _cache_counts(caches)
+    with _in_directory(REPO_ROOT / folder), contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            # Otherwise every pass after the first is served from cache; clearing is not timed
+            for attr, cache in caches.items():
+                CACHES[attr][0](cache)
+            started = time.perf_counter()
+            for item in golden:
+                t0 = time.perf_counter()
+                hits = search(item["query"])
+                latencies.append(time.perf_counter() - t0)
+                if len(ranked_lists) < len(golden):
+                    ranked_lists.append(hits)
+            elapsed += time.perf_counter() - started
+    after = _cache_counts(caches)
+
+    matched = relevance_matrix(ranked_lists, golden, k)
+    cutoffs = sorted({c for c in (1, 3, 5, 10) if c < k} | {k})
+    latency_ms = np.asarray(latencies) * 1000
+    return {
+        "retriever": name,
+        "k": k,
+        "n_queries": len(golden),
+        "repeat": repeat,
+        "metrics": ranking_metrics(matched, [len(item["relevant"]) for item in golden], cutoffs),
+        "latency_ms": {
+            "mean": float(latency_ms.mean()),
+            "p50": float(np.percentile(latency_ms, 50)),
+            "p95": float(np.percentile(latency_ms, 95)),
+            "p99": float(np.percentile(latency_ms, 99)),
+        },
+        "qps": len(latencies) / elapsed if elapsed > 0 else float("inf"),
+        # None when the adapter never went through that cache
+        "cache_hit_rate": {
+            attr: (after[attr][0] - before[attr][0]) / lookups if (lookups := after[attr][1] - before[attr][1]) else None
+            for attr in caches
+        },
+    }
+
+
+def print_report(reports):
+    for report in reports:
+        metrics = " ".join(f"{key}={value:.3f}" for key, value in report["metrics"].items())
+        latency = report["latency_ms"]
+        print(f"{report['retriever']:<20} {metrics}")
+        print(f"{'':<20} p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms qps={report['qps']:.1f}")
+        if report["cache_hit_rate"]:
+            print(f"{'':<20} cache hit rate: " + " ".join(f"{attr}={'n/a' if rate is None else f'{rate:.1%}'}" for attr, rate in report["cache_hit_rate"].items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k / MRR / nDCG and latency for the repo's retrievers")
+    parser.add_argument("--retrievers", nargs="+", default=["simple_rag"], choices=sorted(RETRIEVERS))
+    parser.add_argument("--golden", help="JSONL golden set; defaults to the built-in set for each retriever's corpus")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=1, help="Run the query set N times for steadier latency numbers")
+    parser.add_argument("--output", default="retrieval_eval_report.json")
+    args = parser.parse_args()
+
+    golden = load_golden(args.golden) if args.golden else None
+    reports = [evaluate_retriever(name, golden, k=args.k, repeat=args.repeat) for name in args.retrievers]
+    print_report(reports)
+
+    with open(args.output, "w") as f:
+        json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "reports": reports}, f, indent=2)
+    print(f"\nReport written to {args.output}")
@@ -16,6 +16,8 @@ Why do we need this?
 
 import time
 
+from stage_tracing import span
+
 class ClassicRAG:
     def __init__(self):
         # Simulation of components
@@ -40,8 +42,12 @@ class ClassicRAG:
 
     def run(self, query):
         print("--- Running Classic RAG ---")
-        relevant_chunks = self.retrieve(query)
-        answer = self.generate(query, relevant_chunks)
+        with span("request", pipeline="classic_rag"):
+            with span("retrieve") as s:
+                relevant_chunks = self.retrieve(query)
+                s.set(candidates=len(relevant_chunks))
+            with span("generate"):
+                answer = self.generate(query, relevant_chunks)
         print(f"Final Answer: {answer}\n")
 
 if __name__ == "__main__":
@@ -13,20 +13,108 @@ Flow:
 Why do we need this?
 - "One size fits all" RAG performs poorly when queries vary wildly (e.g., asking for code vs. asking for legal advice).
 - Optimizes cost and latency by using specialized pipelines.
+
+Semantic routing:
+- Keyword checks ("what is", "summarize") miss paraphrases such as "give me a recap",
+  which then fall through to the expensive general pipeline.
+- Instead, each route has a few example utterances. Their embeddings are averaged
+  into one centroid per route, computed once, and stacked into a matrix.
+- Routing a batch of queries is one matrix multiply + argmax. A route only wins
+  if the similarity clears its own threshold; otherwise the query goes to the fallback.
+- The embedder is the same sentence-transformer (all-MiniLM-L6-v2) the rest of the
+  repo uses, so paraphrases with no shared words still match. `--offline` swaps in
+  the word-overlap HashingEmbedder (no model download) with its own thresholds.
 """
 
+import argparse
+import time
+
+import numpy as np
+
+from hashed_embeddings import HashingEmbedder
+from stage_tracing import span
+
+ROUTE_EXAMPLES = {
+    "definition_pipeline": [
+        "What is the definition of retrieval augmented generation?",
+        "Define vector database.",
+        "What does the term embedding mean?",
+        "Meaning of the acronym RAG",
+        "Explain the term chunking in the glossary",
+    ],
+    "summarization_pipeline": [
+        "Summarize the meeting notes.",
+        "Give me a summary of this document.",
+        "Recap the key points of the report.",
+        "TL;DR of the meeting",
+        "Short overview of the notes",
+    ],
+}
+
+# Confidence thresholds per route. They depend on the embedder's similarity range:
+# all-MiniLM-L6-v2 puts unrelated short queries below ~0.25 and paraphrases above ~0.5,
+# while word-overlap hashing scores paraphrases far lower.
+ROUTE_THRESHOLDS = {"definition_pipeline": 0.4, "summarization_pipeline": 0.4}
+HASHING_ROUTE_THRESHOLDS = {"definition_pipeline": 0.2, "summarization_pipeline": 0.15}
+
+def default_embed_fn():
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
+
+class SemanticRouter:
+    def __init__(self, embed_fn, route_examples, thresholds=None, default_threshold=0.4, fallback="general_pipeline"):
+        self.embed_fn = embed_fn
+        self.fallback = fallback
+        self.routes = list(route_examples)
+        thresholds = thresholds or {}
+        self.thresholds = np.array([thresholds.get(r, default_threshold) for r in self.routes], dtype=np.float32)
+        self.centroids = np.stack([self._centroid(route_examples[r]) for r in self.routes])  # (n_routes, dim)
+
+    def _centroid(self, examples):
+        vectors = _normalize(np.asarray(self.embed_fn(examples), dtype=np.float32))
+        return _normalize(vectors.mean(axis=0, keepdims=True))[0]
+
+    def route_batch(self, queries, batch_size=1024):
+        """
+        Returns one (route, confidence) pair per query.
+        """
+        results = []
+        for start in range(0, len(queries), batch_size):
+            embeddings = _normalize(np.asarray(self.embed_fn(queries[start:start + batch_size]), dtype=np.float32))
+            sims = embeddings @ self.centroids.T  # (batch, n_routes)
+            best = sims.argmax(axis=1)
+            confidence = sims[np.arange(len(best)), best]
+            accepted = confidence >= self.thresholds[best]
+            results += [
+                (self.routes[b] if ok else self.fallback, float(c))
+                for b, c, ok in zip(best, confidence, accepted)
+            ]
+        return results
+
+    def route(self, query):
+        return self.route_batch([query])[0]
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
 class BranchedRAG:
-    def __init__(self):
-        pass
+    def __init__(self, embed_fn=None, thresholds=None, offline=False):
+        if offline:
+            # Explicit fallback without a model: only matches queries sharing words with the examples
+            embed_fn, thresholds = HashingEmbedder(), HASHING_ROUTE_THRESHOLDS
+        self.semantic_router = SemanticRouter(
+            embed_fn or default_embed_fn(),
+            ROUTE_EXAMPLES,
+            thresholds=thresholds or ROUTE_THRESHOLDS,
+        )
 
     def router(self, query):
-        # Simple keyword-based routing for demonstration
-        if "define" in query.lower() or "what is" in query.lower():
-            return "definition_pipeline"
-        elif "summarize" in query.lower():
-            return "summarization_pipeline"
-        else:
-            return "general_pipeline"
+        with span("route") as s:
+            intent, confidence = self.semantic_router.route(query)
+            s.set(route=intent, confidence=round(confidence, 4))
+        print(f"[Router] {intent} (confidence {confidence:.2f})")
+        return intent
 
     def definition_pipeline(self, query):
         print("[Router] Selected: Definition Pipeline")
@@ -46,19 +134,33 @@ class BranchedRAG:
 
     def run(self, query):
         print(f"--- Processing: '{query}' ---")
-        intent = self.router(query)
-        
-        if intent == "definition_pipeline":
-            response = self.definition_pipeline(query)
-        elif intent == "summarization_pipeline":
-            response = self.summarization_pipeline(query)
-        else:
-            response = self.general_pipeline(query)
+        with span("request", pipeline="branched"):
+            intent = self.router(query)
+            
+            with span("generate", route=intent):
+                if intent == "definition_pipeline":
+                    response = self.definition_pipeline(query)
+                elif intent == "summarization_pipeline":
+                    response = self.summarization_pipeline(query)
+                else:
+                    response = self.general_pipeline(query)
         
         print(f"Result: {response}\n")
 
 if __name__ == "__main__":
-    rag = BranchedRAG()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--offline", action="store_true", help="Route with the hashing embedder (no model download)")
+    args = parser.parse_args()
+
+    rag = BranchedRAG(offline=args.offline)
     rag.run("What is Retrieval-Augmented Generation?")
     rag.run("Summarize the meeting notes.")
     rag.run("How's the weather?")
+    rag.run("Give me a quick recap of the report")  # Missed by keyword routing
+
+    # Batch routing: thousands of queries in a few vectorized calls
+    queries = ["Define embedding", "Recap the notes", "Who won the match?"] * 1000
+    started = time.perf_counter()
+    routes = rag.semantic_router.route_batch(queries)
+    elapsed = time.perf_counter() - started
+    print(f"Routed {len(queries)} queries in {elapsed * 1000:.1f}ms: {[r for r, _ in routes[:3]]}")
@@ -13,54 +13,127 @@ Why do we need this?
 - Standard RAG treats every query as an isolated event.
 - If a user asks "Who is the CEO of Google?" then "How old is he?", standard RAG fails on the second question because "he" is ambiguous without history.
 - Memory-Enhanced RAG rewrites the second query to "How old is the CEO of Google?" before searching.
+
+Memory is per session (`chat(user_input, session_id)`) and bounded: see
+`session_memory.py`. Old turns are summarized, idle sessions are evicted, and the
+reformulation prompt never grows past the window + summary budget.
+
+Follow-up turns reuse the candidate pool of the last full search: if the
+standalone query is still close to the query that BUILT the pool (cosine >=
+`drift_threshold`), the pool's stored embeddings are re-scored instead of
+searching the whole index. Drift is always measured against that anchor, never
+against the previous turn, so a conversation that wanders a little each turn
+still triggers a fresh search once it has moved away from the pool's topic.
 """
 
+import re
+
+import numpy as np
+
+from hashed_embeddings import HashingEmbedder
+from session_memory import SessionMemoryStore
+from stage_tracing import current_span, span
+
 class MemoryEnhancedRAG:
-    def __init__(self):
-        self.history = []
-        self.knowledge = {
-            "sundar": "Sundar Pichai is the CEO of Google and Alphabet.",
-            "age": "Sundar Pichai was born in 1972 (approx 52 years old)."
-        }
-
-    def reformulate_query(self, query):
-        if not self.history:
+    def __init__(self, memory=None, embed_fn=None, pool_size=4, drift_threshold=0.45):
+        # Pass SessionMemoryStore(db_path="sessions.db") to keep sessions across restarts
+        self.memory = memory or SessionMemoryStore(window_tokens=256, summary_tokens=64)
+        self.embed_fn = embed_fn or HashingEmbedder()
+        self.pool_size = pool_size
+        # Follow-ups about the same entity score 0.5-0.6 against the anchor with the hashing
+        # embedder (unrelated questions: ~0). With a sentence-transformer, same-topic
+        # follow-ups also land above ~0.5, so 0.45 only keeps genuine follow-ups.
+        self.drift_threshold = drift_threshold
+        self.stats = {"index_searches": 0, "pool_reuses": 0}
+
+        self.knowledge = [
+            "Sundar Pichai is the CEO of Google and Alphabet.",
+            "Sundar Pichai was born in 1972 (approx 52 years old).",
+            "Sundar Pichai studied at IIT Kharagpur, Stanford and Wharton.",
+            "Google was founded by Larry Page and Sergey Brin in 1998.",
+            "Alphabet is the parent company of Google.",
+            "Satya Nadella is the CEO of Microsoft.",
+            "Microsoft was founded by Bill Gates and Paul Allen in 1975.",
+            "The Eiffel Tower is in Paris.",
+        ]
+        self.knowledge_embeddings = self.embed_fn(self.knowledge)  # The "index"
+
+    def reformulate_query(self, query, session):
+        last_turn = session.last_turn()
+        if last_turn is None and not session.summary:
             return query
         
-        print(f"   [Memory] History found: {self.history}")
+        # Bounded prompt: running summary + recent window, cached between turns
+        context = session.prompt_context()
+        print(f"   [Memory] Context ({len(context.split())} tokens): {context!r}")
         print("   [Memory] Rewriting query to be standalone...")
         # Simulation of LLM rewriting "How old is he?" -> "How old is Sundar Pichai?"
-        if "he" in query.lower() and "sundar" in str(self.history[-1]).lower():
+        if re.search(r"\bhe\b", query.lower()) and last_turn and "sundar" in " ".join(last_turn).lower():
             return "How old is Sundar Pichai?"
         return query
 
-    def retrieve(self, query):
-        print(f"   [Retrieve] Searching for: '{query}'")
-        if "ceo" in query.lower():
-            return self.knowledge["sundar"]
-        elif "old" in query.lower() and "sundar" in query.lower():
-            return self.knowledge["age"]
-        return "No info found."
+    def search_index(self, query_embedding):
+        # Full search over every document: the expensive step we want to skip on follow-ups
+        self.stats["index_searches"] += 1
+        scores = self.knowledge_embeddings @ query_embedding
+        rows = np.argsort(-scores, kind="stable")[:self.pool_size]
+        return {"query_embedding": query_embedding, "rows": rows, "embeddings": self.knowledge_embeddings[rows]}
+
+    def retrieve(self, query, session, min_score=0.1):
+        query_embedding = self.embed_fn([query])[0]
+        pool = session.state.get("candidate_pool")
+
+        if pool is not None and float(pool["query_embedding"] @ query_embedding) >= self.drift_threshold:
+            # Same topic as the search that built the pool: re-rank its candidates with their stored embeddings
+            print(f"   [Retrieve] Follow-up, re-ranking {len(pool['rows'])} pooled candidates for: '{query}'")
+            self.stats["pool_reuses"] += 1
+            current_span().set(cache_hit=True)
+        else:
+            print(f"   [Retrieve] Searching the index for: '{query}'")
+            pool = self.search_index(query_embedding)
+            # The pool keeps the embedding of the query it was built for: the drift anchor
+            session.state["candidate_pool"] = pool
+            current_span().set(cache_hit=False)
+        current_span().set(candidates=len(pool["rows"]))
+
+        scores = pool["embeddings"] @ query_embedding
+        best = int(np.argmax(scores))
+        if scores[best] < min_score:
+            return "No info found."
+        return self.knowledge[pool["rows"][best]]
 
-    def chat(self, user_input):
-        print(f"User: {user_input}")
+    def chat(self, user_input, session_id="default"):
+        print(f"User ({session_id}): {user_input}")
+        session = self.memory.get(session_id)
         
-        # Step 1: Reformulate based on history
-        standalone_query = self.reformulate_query(user_input)
-        if standalone_query != user_input:
-            print(f"   (Rewritten Query: '{standalone_query}')")
+        with span("request", pipeline="memory_enhanced", session_id=session_id):
+            # Step 1: Reformulate based on this session's memory
+            with span("reformulate") as s:
+                standalone_query = self.reformulate_query(user_input, session)
+                s.set(rewritten=standalone_query != user_input)
+            if standalone_query != user_input:
+                print(f"   (Rewritten Query: '{standalone_query}')")
 
-        # Step 2: Retrieve
-        context = self.retrieve(standalone_query)
+            # Step 2: Retrieve (cache_hit = the session's candidate pool was reused)
+            with span("retrieve"):
+                context = self.retrieve(standalone_query, session)
 
-        # Step 3: Generate
-        answer = f"Based on '{context}', here is the answer."
+            # Step 3: Generate
+            with span("generate"):
+                answer = f"Based on '{context}', here is the answer."
         print(f"AI: {answer}\n")
 
-        # Update history
-        self.history.append((user_input, answer))
+        # Update memory (older turns get folded into the summary)
+        self.memory.add_turn(session_id, user_input, answer)
+        return answer
 
 if __name__ == "__main__":
     bot = MemoryEnhancedRAG()
-    bot.chat("Who is the CEO of Google?")
-    bot.chat("How old is he?")
+    bot.chat("Who is the CEO of Google?", session_id="alice")
+    bot.chat("Who is the CEO of Google?", session_id="bob")
+    bot.chat("How old is he?", session_id="alice")
+    bot.chat("When was Sundar Pichai born?", session_id="alice")   # Follow-up: reuses the pool
+    bot.chat("Did Sundar Pichai go to Stanford?", session_id="alice")  # Follow-up: reuses the pool
+    bot.chat("Where is the Eiffel Tower?", session_id="alice")      # Topic drift: full search
+    print(f"Memory stats: {bot.memory.stats}")
+    print(f"Retrieval stats: {bot.stats}")
@@ -15,6 +15,13 @@ Why do we need this?
 - Without this, RAG returns generic or incorrect info for the specific user.
 """
 
+import sys
+from pathlib import Path
+
+# The bitmap metadata index lives with the other retrieval components in 02_Intermediate_RAG
+sys.path.append(str(Path(__file__).resolve().parent.parent / "02_Intermediate_RAG"))
+from metadata_index import MetadataIndex
+
 class ContextualRAG:
     def __init__(self):
         # Mock database with metadata
@@ -23,24 +30,28 @@ class ContextualRAG:
             {"content": "Contractors get 0 days PTO.", "role": "contractor", "region": "US"},
             {"content": "European employees get 30 days PTO.", "role": "full_time", "region": "EU"}
         ]
+        # One bitmap per (field, value), built once
+        self.metadata_index = MetadataIndex()
+        self.metadata_index.add_many(
+            range(len(self.db)),
+            [{"role": doc["role"], "region": doc["region"]} for doc in self.db]
+        )
 
     def retrieve(self, query, user_context):
         print(f"Query: '{query}' | Context: {user_context}")
         
+        # 1. Context Filtering (The Key Part)
+        # Resolve the user's context to candidate rows BEFORE looking at any content,
+        # instead of checking role/region on every document.
+        where = {"$and": [{"role": user_context["role"]}, {"region": user_context["region"]}]}
+        candidate_rows = self.metadata_index.candidate_rows(where)
+        print(f"   [Filter] {len(candidate_rows)} of {len(self.db)} docs match the context")
+        
         results = []
-        for doc in self.db:
-            # 1. Content Relevance (Mock)
+        for row in candidate_rows:
+            doc = self.db[row]
+            # 2. Content Relevance (Mock)
             if "policy" in query.lower() or "pto" in query.lower():
-                
-                # 2. Context Filtering (The Key Part)
-                # Check Role Match
-                if doc["role"] != user_context["role"]:
-                    continue
-                
-                # Check Region Match
-                if doc["region"] != user_context["region"]:
-                    continue
-
                 results.append(doc["content"])
         
         return results
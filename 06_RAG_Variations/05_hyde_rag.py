@@ -15,39 +15,119 @@ Why do we need this?
 - "How do I fix error 500?" (Question) is not semantically similar to "Error 500 is caused by..." (Answer).
 - But the Hypothetical Answer "To fix error 500, check logs..." IS similar to the real documentation.
 - It bridges the "Question-Answer Gap".
+
+Overlapped mode (`run(query, overlapped=True)`):
+- Plain HyDE adds a full LLM round-trip before retrieval can even start.
+- Overlapped mode starts raw-query retrieval immediately and generates the
+  hypothetical answer at the same time. When both arrive, the two result lists
+  are fused with Reciprocal Rank Fusion.
+- If the LLM misses `deadline_s`, the raw-query results are returned as they are,
+  so HyDE never makes the user wait longer than the deadline.
 """
 
+import asyncio
+import contextvars
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "03_Advanced_RAG"))
+from query_expansion import reciprocal_rank_fusion
+
+from stage_tracing import current_span, span
+
 class HyDeRAG:
-    def __init__(self):
-        pass
+    def __init__(self, llm_latency_s=0.0, retrieval_latency_s=0.0, deadline_s=1.0):
+        # Simulated latencies, to show what overlapping saves
+        self.llm_latency_s = llm_latency_s
+        self.retrieval_latency_s = retrieval_latency_s
+        self.deadline_s = deadline_s
+        # Own pool: asyncio.run() would otherwise wait for a late LLM call when it shuts down
+        # the default executor, which defeats the deadline
+        self._executor = ThreadPoolExecutor(max_workers=4)
 
     def generate_hypothetical_answer(self, query):
         print(f"[HyDe] Generating fake answer for: '{query}'")
-        # LLM Hallucination Simulation
-        if "policy" in query:
-            return "The return policy allows for returns within 30 days if the item is unused."
-        return "Generic hypothetical answer about " + query
+        with span("reformulate", method="hyde"):
+            time.sleep(self.llm_latency_s)
+            # LLM Hallucination Simulation
+            if "policy" in query:
+                return "The return policy allows for returns within 30 days if the item is unused."
+            return "Generic hypothetical answer about " + query
 
     def retrieve(self, search_query):
         print(f"[Retrieve] Vector searching with: '{search_query}'")
-        # Simulation: In real life, this embedding matches the content better than the raw question
-        return ["Real Doc: Returns are accepted within 30 days.", "Real Doc: Items must be in original packaging."]
+        with span("retrieve") as s:
+            time.sleep(self.retrieval_latency_s)
+            # Simulation: In real life, this embedding matches the content better than the raw question
+            docs = ["Real Doc: Returns are accepted within 30 days.", "Real Doc: Items must be in original packaging."]
+            s.set(candidates=len(docs))
+        return docs
 
-    def run(self, query):
-        print(f"--- Processing: '{query}' ---")
-        
-        # Step 1: Hallucinate
-        hypothetical = self.generate_hypothetical_answer(query)
+    def _submit(self, loop, fn, *args):
+        # A fresh context copy per call keeps the pool's spans inside the current request trace
+        return loop.run_in_executor(self._executor, contextvars.copy_context().run, fn, *args)
+
+    async def retrieve_overlapped(self, query, deadline_s=None):
+        """
+        Raw-query retrieval and hypothetical-answer generation run concurrently.
+        Returns the RRF-fused documents, or the raw-query documents if the LLM misses the deadline.
+        """
+        deadline_s = self.deadline_s if deadline_s is None else deadline_s
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        raw_task = self._submit(loop, self.retrieve, query)
+        hypothetical_task = self._submit(loop, self.generate_hypothetical_answer, query)
+
+        try:
+            hypothetical = await asyncio.wait_for(hypothetical_task, timeout=deadline_s)
+        except asyncio.TimeoutError:
+            print(f"   (LLM missed the {deadline_s}s deadline: using raw-query results)")
+            current_span().set(deadline_missed=True)
+            return await raw_task
         print(f"   (Hypothetical: '{hypothetical}')")
 
-        # Step 2: Use the Hallucination to Search
-        docs = self.retrieve(hypothetical)
+        # The raw search has usually finished by now; only the HyDE search is left
+        remaining = max(0.0, deadline_s - (time.perf_counter() - started))
+        hyde_task = self._submit(loop, self.retrieve, hypothetical)
+        raw_docs = await raw_task
+        try:
+            hyde_docs = await asyncio.wait_for(hyde_task, timeout=remaining)
+        except asyncio.TimeoutError:
+            print(f"   (HyDE search missed the {deadline_s}s deadline: using raw-query results)")
+            current_span().set(deadline_missed=True)
+            return raw_docs
+
+        # The mock documents are their own chunk ids
+        fused = reciprocal_rank_fusion([[(d, d) for d in hyde_docs], [(d, d) for d in raw_docs]])
+        return [document for _, document, _ in fused]
+
+    def run(self, query, overlapped=False, deadline_s=None):
+        print(f"--- Processing: '{query}' ({'overlapped' if overlapped else 'sequential'}) ---")
+        started = time.perf_counter()
         
-        # Step 3: Generate Final Answer
-        print(f"   (Retrieved Docs: {docs})")
-        print("Final Answer based on Real Docs: ...")
+        with span("request", pipeline="hyde", overlapped=overlapped):
+            if overlapped:
+                # Steps 1 and 2 run concurrently with a raw-query search
+                docs = asyncio.run(self.retrieve_overlapped(query, deadline_s))
+            else:
+                # Step 1: Hallucinate
+                hypothetical = self.generate_hypothetical_answer(query)
+                print(f"   (Hypothetical: '{hypothetical}')")
+
+                # Step 2: Use the Hallucination to Search
+                docs = self.retrieve(hypothetical)
+            
+            # Step 3: Generate Final Answer
+            print(f"   (Retrieved Docs: {docs})")
+            print(f"   (Retrieval took {time.perf_counter() - started:.2f}s)")
+            with span("generate"):
+                print("Final Answer based on Real Docs: ...")
         print("")
 
 if __name__ == "__main__":
-    rag = HyDeRAG()
-    rag.run("What is the return policy?")
+    rag = HyDeRAG(llm_latency_s=0.5, retrieval_latency_s=0.2, deadline_s=1.0)
+    rag.run("What is the return policy?")                   # ~0.7s: LLM, then search
+    rag.run("What is the return policy?", overlapped=True)  # ~0.7s, but the raw results were ready at 0.2s
+    rag.run("What is the return policy?", overlapped=True, deadline_s=0.3)  # LLM too slow: raw results at ~0.3s
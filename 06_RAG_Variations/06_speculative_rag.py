@@ -6,19 +6,31 @@ Generating multiple "perspectives" or "sub-questions" to ensure full coverage.
 
 Flow:
 1. User Query -> LLM -> Generate 3 Variations/Angles
-2. For each Variation -> Vector Search -> Results
-3. Aggregate All Results -> LLM -> Final Answer
+2. All Variations -> Vector Search, concurrently (fan-out) -> Results
+3. Merge with Reciprocal Rank Fusion (de-duplicated by chunk id) -> LLM -> Final Answer
 
 Why do we need this?
 - User queries are often vague: "Tell me about Apple."
 - Does he mean the fruit? The company stock? The history? The new iPhone?
 - Speculative RAG generates: "Apple fruit nutrition", "Apple Inc stock", "Apple company history".
 - Ensures high recall for broad topics.
+- Searching the perspectives one after another would multiply latency by their
+  number, so they are searched in parallel and cost about as much as one search.
 """
 
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "03_Advanced_RAG"))
+from query_expansion import fan_out_search, reciprocal_rank_fusion
+
+from stage_tracing import span
+
 class SpeculativeRAG:
-    def __init__(self):
-        pass
+    def __init__(self, embed_fn=None, top_n=5):
+        # embed_fn(list of texts) -> vectors; when set, all perspectives are embedded in one batch
+        self.embed_fn = embed_fn
+        self.top_n = top_n
 
     def generate_perspectives(self, query):
         print(f"[Speculator] Brainstorming angles for: '{query}'")
@@ -31,30 +43,40 @@ class SpeculativeRAG:
             ]
         return [query]
 
+    def search(self, sub_query, embedding=None):
+        print(f"   -> Searching for: '{sub_query}'")
+        # Mock retrieval: ranked (chunk_id, document) pairs
+        if "Company" in sub_query:
+            return [("apple_inc_1", "Doc: Apple Inc revenue is $300B."), ("apple_fruit_1", "Doc: Apples contain fiber.")]
+        if "Fruit" in sub_query:
+            return [("apple_fruit_1", "Doc: Apples contain fiber.")]
+        return []
+
     def retrieve(self, sub_queries):
-        all_docs = []
-        for q in sub_queries:
-            print(f"   -> Searching for: '{q}'")
-            # Mock retrieval
-            if "Company" in q:
-                all_docs.append("Doc: Apple Inc revenue is $300B.")
-            elif "Fruit" in q:
-                all_docs.append("Doc: Apples contain fiber.")
-        return all_docs
+        # One concurrent search per perspective, merged and de-duplicated by chunk id
+        result_lists = fan_out_search(sub_queries, self.search, embed_fn=self.embed_fn)
+        fused = reciprocal_rank_fusion(result_lists, top_n=self.top_n)
+        return [document for _, document, _ in fused]
 
     def run(self, query):
         print(f"--- Processing: '{query}' ---")
         
-        # Step 1: Speculate
-        perspectives = self.generate_perspectives(query)
-        print(f"   (Perspectives: {perspectives})")
+        with span("request", pipeline="speculative"):
+            # Step 1: Speculate
+            with span("reformulate", method="perspectives") as s:
+                perspectives = self.generate_perspectives(query)
+                s.set(sub_queries=len(perspectives))
+            print(f"   (Perspectives: {perspectives})")
 
-        # Step 2: Retrieve for all
-        docs = self.retrieve(perspectives)
-        
-        # Step 3: Synthesize
-        print(f"   (Aggregated Context: {docs})")
-        print("Final Answer: Covers both the tech giant and the fruit.")
+            # Step 2: Retrieve for all
+            with span("retrieve") as s:
+                docs = self.retrieve(perspectives)
+                s.set(candidates=len(docs))
+            
+            # Step 3: Synthesize
+            print(f"   (Aggregated Context: {docs})")
+            with span("generate"):
+                print("Final Answer: Covers both the tech giant and the fruit.")
         print("")
 
 if __name__ == "__main__":
@@ -0,0 +1,43 @@
+"""
+Tiny deterministic text embedder for the demos in this folder.
+
+Content words and word pairs are hashed into a fixed number of dimensions (the
+"hashing trick") and the vector is L2-normalized, so a dot product is a cosine
+similarity. No model download, no API key, same vectors on every run.
+
+It only captures word overlap, not meaning. Any callable with the same
+signature (list of texts -> (n, dim) array) can replace it, e.g.
+chromadb's DefaultEmbeddingFunction or a sentence-transformers model's `encode`.
+"""
+
+import re
+import zlib
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Function words would make every question look alike
+STOP_WORDS = frozenset(
+    "a an and are as at be by did do does for from had has have he her his how i in is it its "
+    "me my of on or she that the their them they this to was we were what when where which who "
+    "why will with you your".split()
+)
+
+
+class HashingEmbedder:
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        words = [w for w in _WORD.findall(text.lower()) if w not in STOP_WORDS]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # The sign bit spreads collisions out instead of letting them pile up
+                vectors[i, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
@@ -0,0 +1,171 @@
+"""
+Session-scoped, bounded conversation memory.
+
+A plain `history = []` grows forever, and pasting it into the reformulation
+prompt makes every turn more expensive than the last. This store keeps, per session:
+
+- a window of recent turns that fits in `window_tokens`,
+- a running summary of everything older. When turns fall out of the window they
+  are folded into the summary, a few turns at a time (incremental, never the
+  whole history again),
+- the prompt context string, rebuilt only when the session changes.
+
+Sessions idle for longer than `idle_ttl_s` (or beyond `max_sessions`, least
+recently used first) are dropped from memory. With `db_path`, every turn is
+written through to SQLite, so an evicted or restarted session is reloaded on
+its next message.
+
+    memory = SessionMemoryStore(window_tokens=256, db_path="sessions.db")
+    memory.add_turn("user-42", "Who is the CEO of Google?", "Sundar Pichai.")
+    memory.get("user-42").prompt_context()
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def count_tokens(text):
+    # Whitespace tokens: close enough for budgeting; swap in a real tokenizer if needed
+    return len(text.split())
+
+
+def summarize_turns(summary, turns, max_tokens=128):
+    """
+    Folds `turns` into `summary`. In reality: an LLM call such as
+    "Update this summary with the following exchanges: ...".
+    """
+    # Simulation: keep the user's questions, drop the oldest words beyond the budget
+    words = summary.split() + [word for user, _ in turns for word in f"Asked: {user}".split()]
+    return " ".join(words[-max_tokens:])
+
+
+class Session:
+    def __init__(self, session_id, summary="", turns=()):
+        self.session_id = session_id
+        self.summary = summary
+        self.turns = deque(turns)  # (user, assistant, n_tokens), oldest first
+        self.window_tokens = sum(n for _, _, n in self.turns)
+        self.state = {}  # Per-session scratch space for the pipeline (not persisted)
+        self.lock = threading.Lock()
+        self._context = None
+
+    def last_turn(self):
+        return self.turns[-1][:2] if self.turns else None
+
+    def prompt_context(self):
+        """
+        Summary + recent turns as prompt text. Its size is bounded by the store's budgets.
+        """
+        if self._context is None:
+            lines = [f"Summary: {self.summary}"] if self.summary else []
+            for user, assistant, _ in self.turns:
+                lines += [f"User: {user}", f"AI: {assistant}"]
+            self._context = "\n".join(lines)
+        return self._context
+
+
+class SessionMemoryStore:
+    def __init__(self, window_tokens=512, summary_tokens=128, idle_ttl_s=1800, max_sessions=10_000,
+                 summarize_fn=summarize_turns, db_path=None, clock=time.monotonic):
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.idle_ttl_s = idle_ttl_s
+        self.max_sessions = max_sessions
+        self.summarize_fn = summarize_fn
+        self.clock = clock
+        self.stats = {"created": 0, "loaded": 0, "evicted": 0, "summarized_turns": 0}
+        self._sessions = OrderedDict()  # session_id -> (Session, last_active), least recently active first
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db_lock = threading.Lock()
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions ("
+                    "session_id TEXT PRIMARY KEY, summary TEXT, turns TEXT, updated_at REAL)"
+                )
+
+    def __len__(self):
+        return len(self._sessions)
+
+    # --- Public API ---
+    def get(self, session_id):
+        """
+        The session, from memory, from SQLite, or new.
+        """
+        now = self.clock()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.pop(session_id, None)
+            session = entry[0] if entry else self._load(session_id)
+            self._sessions[session_id] = (session, now)  # Re-insert at the most recent end
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evicted"] += 1
+        return session
+
+    def add_turn(self, session_id, user, assistant):
+        session = self.get(session_id)
+        with session.lock:
+            n_tokens = count_tokens(user) + count_tokens(assistant)
+            session.turns.append((user, assistant, n_tokens))
+            session.window_tokens += n_tokens
+
+            # Fold the oldest turns into the summary until the window fits (keep at least the last turn)
+            overflow = []
+            while session.window_tokens > self.window_tokens and len(session.turns) > 1:
+                old_user, old_assistant, old_tokens = session.turns.popleft()
+                session.window_tokens -= old_tokens
+                overflow.append((old_user, old_assistant))
+            if overflow:
+                session.summary = self.summarize_fn(session.summary, overflow, self.summary_tokens)
+                self.stats["summarized_turns"] += len(overflow)
+            session._context = None
+            self._save(session)
+        return session
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+    # --- Internals ---
+    def _evict_idle(self, now):
+        # Oldest activity first, so stop at the first session that is still active
+        while self._sessions:
+            session_id, (_, last_active) = next(iter(self._sessions.items()))
+            if now - last_active <= self.idle_ttl_s:
+                break
+            del self._sessions[session_id]
+            self.stats["evicted"] += 1
+
+    def _load(self, session_id):
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT summary, turns FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+            if row:
+                self.stats["loaded"] += 1
+                return Session(session_id, row[0], [tuple(turn) for turn in json.loads(row[1])])
+        self.stats["created"] += 1
+        return Session(session_id)
+
+    def _save(self, session):
+        if self._db is None:
+            return
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, summary, turns, updated_at) VALUES (?, ?, ?, ?)",
+                (session.session_id, session.summary, json.dumps(list(session.turns)), time.time()),
+            )
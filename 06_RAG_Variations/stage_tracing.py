@@ -0,0 +1,37 @@
+"""
+Optional per-stage tracing for the pipelines in this folder.
+
+    from stage_tracing import current_span, span
+
+Spans come from 08_Production_Challenges/tracing.py (active only when
+RAG_TRACE=1). Without that module, `span()` and `current_span()` return a no-op
+span, so the pipelines still run on their own.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "08_Production_Challenges"))
+
+try:
+    from tracing import current_span, span
+except ImportError:
+    class _NoopSpan:
+        __slots__ = ()
+
+        def set(self, **attributes):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc, tb):
+            return False
+
+    _NOOP_SPAN = _NoopSpan()
+
+    def span(name, **attributes):
+        return _NOOP_SPAN
+
+    def current_span():
+        return _NOOP_SPAN
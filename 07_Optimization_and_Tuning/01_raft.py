@@ -13,66 +13,311 @@ For each question, we create training samples with:
 3. A list of "Distractor" documents (irrelevant docs to teach robustness)
 4. Chain of Thought (CoT) reasoning
 5. The Final Answer
+
+Generating at scale (millions of items):
+- Distractors are HARD negatives: a fixed number per question, mined from a
+  BM25 index (03_Advanced_RAG/bm25_index.py) as chunks similar to the question
+  and its oracle, minus the oracle itself. Using every other document would make
+  each item O(corpus), and random documents are too easy to ignore.
+- In a share of items (1 - oracle_fraction) the oracle is left out, as in the
+  RAFT paper, so the model also learns to cope without it.
+- Items are streamed to JSONL shards by a process pool. Each worker builds the
+  index once, and only a bounded number of shards is in flight, so memory does
+  not grow with the dataset size.
+- Every item draws from its own RNG, seeded by (seed, item index). The output
+  is identical whatever the number of workers or the shard size.
+
+    python 01_raft.py                                  # Toy demo
+    python 01_raft.py --corpus corpus.jsonl --questions questions.jsonl --output-dir raft_data
+    python 01_raft.py --synthetic 100000 --output-dir raft_data --workers 8
+
+corpus.jsonl holds {"id", "text"} per line; questions.jsonl holds
+{"question", "oracle_ids", optional "answer"} per line.
 """
 
-import random
+import argparse
+import itertools
 import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
 
-class RAFTSimulator:
-    def __init__(self):
-        self.corpus = {
-            "doc1": "AlphaCorp's revenue in 2023 was $5B.",
-            "doc2": "BetaInc's CEO is Jane Doe.",
-            "doc3": "AlphaCorp focuses on AI hardware.",
-            "doc4": "GammaLtd makes solar panels."
-        }
-        
-    def generate_dataset_item(self, question, oracle_doc_ids):
-        # 1. Get Oracle Docs (The "Truth")
-        oracle_docs = [self.corpus[doc_id] for doc_id in oracle_doc_ids]
-        
-        # 2. Get Distractor Docs (Noise)
-        all_ids = list(self.corpus.keys())
-        distractor_ids = [did for did in all_ids if did not in oracle_doc_ids]
-        distractor_docs = [self.corpus[did] for did in distractor_ids]
-        
-        # 3. Combine and Shuffle
-        context_docs = oracle_docs + distractor_docs
-        random.shuffle(context_docs)
-        
-        # 4. Synthesize Chain of Thought (CoT)
+import numpy as np
+from scipy import sparse
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "03_Advanced_RAG"))
+from bm25_index import BM25Index, tokenize
+
+INSTRUCTION = "Answer the question based strictly on the context provided."
+
+class RAFTGenerator:
+    def __init__(self, corpus, n_distractors=3, oracle_fraction=0.8, candidate_pool=2, mining_batch=256, max_df=0.1, seed=0):
+        """
+        corpus: iterable of (doc_id, text).
+        Distractors are sampled from the top n_distractors * candidate_pool hard negatives.
+        """
+        self.n_distractors = n_distractors
+        self.oracle_fraction = oracle_fraction
+        self.candidate_pool = candidate_pool
+        self.mining_batch = mining_batch  # Questions per sparse product
+        self.seed = seed
+
+        self.index = BM25Index()
+        for doc_id, text in corpus:
+            self.index.add(doc_id, text)
+        self.weighted = self.index.weighted_matrix()  # Built once, not on the first query of every worker
+        # Terms in more than max_df of the chunks ("what", "is") barely move BM25 scores,
+        # but their posting lists would make every question touch most of the corpus.
+        # Terms in up to 1000 chunks are always kept: they are cheap, and small corpora need them
+        self.mining_terms = np.asarray(self.index.doc_freq) <= max(1000, max_df * len(self.index))
+
+    def mine_hard_negatives(self, questions, oracle_rows):
+        """
+        Ranked hard-negative rows for each question: BM25 hits for the question plus
+        its oracle text, without the oracle rows or exact copies of their text.
+        """
+        docs, vocabulary = self.index.row_documents, self.index.vocabulary
+        query_rows, query_cols = [], []
+        for q, (question, rows) in enumerate(zip(questions, oracle_rows)):
+            text = question + " " + " ".join(docs[r] for r in rows)
+            cols = {vocabulary[t] for t in tokenize(text) if t in vocabulary}
+            cols = [c for c in cols if self.mining_terms[c]]
+            query_rows.extend([q] * len(cols))
+            query_cols.extend(cols)
+        query_matrix = sparse.csr_matrix(
+            (np.ones(len(query_cols)), (query_rows, query_cols)), shape=(len(questions), len(vocabulary))
+        )
+        # Kept sparse: the cost follows the posting lists, not the corpus size
+        scores = (query_matrix @ self.weighted.T).tocsr()
+
+        hard = []
+        for q, rows in enumerate(oracle_rows):
+            k = self.n_distractors * self.candidate_pool + len(rows)  # Per question, so batching never changes the result
+            start, end = scores.indptr[q], scores.indptr[q + 1]
+            hits, values = scores.indices[start:end], scores.data[start:end]
+            if len(hits) > k:
+                top = np.argpartition(-values, k - 1)[:k]
+                hits, values = hits[top], values[top]
+            hits = hits[np.lexsort((hits, -values))]  # Score descending, ties by row for determinism
+            oracle_texts = {docs[r] for r in rows}
+            hard.append([int(r) for r in hits if r not in rows and docs[r] not in oracle_texts])
+        return hard
+
+    def make_item(self, item_index, record, oracle_rows, hard_rows):
+        rng = np.random.default_rng([self.seed, item_index])
+        docs, n_rows = self.index.row_documents, len(self.index.row_ids)
+
+        # 1. A fixed number of distractors: sampled from the hard negatives, topped up at random
+        pool = hard_rows[:self.n_distractors * self.candidate_pool]
+        take = min(self.n_distractors, len(pool))
+        distractors = [pool[i] for i in sorted(rng.choice(len(pool), size=take, replace=False))] if take else []
+        excluded = set(oracle_rows) | set(distractors)
+        missing = min(self.n_distractors - len(distractors), n_rows - len(excluded))
+        while missing > 0:
+            row = int(rng.integers(n_rows))
+            if row not in excluded:
+                distractors.append(row)
+                excluded.add(row)
+                missing -= 1
+
+        # 2. Oracle kept in most items, left out in the rest
+        with_oracle = bool(rng.random() < self.oracle_fraction)
+        context_rows = (list(oracle_rows) if with_oracle else []) + distractors
+        rng.shuffle(context_rows)
+
+        # 3. Synthesize Chain of Thought (CoT)
         # In real life, an LLM (GPT-4) generates this part for the training data
+        question = record["question"]
         cot_reasoning = (
             f"I need to answer '{question}'. "
-            f"Looking at the context, I see a document mentioning '{oracle_docs[0]}'. "
+            f"Looking at the context, I see a document mentioning '{docs[oracle_rows[0]]}'. "
             "Therefore, I can conclude the answer."
         )
-        
-        return {
+
+        item = {
             "question": question,
-            "context_list": context_docs,
+            "context_list": [docs[r] for r in context_rows],
             "cot_thought": cot_reasoning,
-            "instruction": "Answer the question based strictly on the context provided."
+            "instruction": INSTRUCTION,
+            "oracle_ids": list(record["oracle_ids"]),
+            "distractor_ids": [self.index.row_ids[r] for r in distractors],
+            "oracle_in_context": with_oracle,
         }
+        if "answer" in record:
+            item["answer"] = record["answer"]
+        return item
+
+    def generate(self, records, start_index=0):
+        """
+        Yields one RAFT item per {"question", "oracle_ids"} record. Items are numbered
+        from start_index, which seeds their RNG.
+        """
+        records = iter(records)
+        item_index = start_index
+        while True:
+            batch = list(itertools.islice(records, self.mining_batch))
+            if not batch:
+                return
+            oracle_rows = []
+            for record in batch:
+                unknown = [doc_id for doc_id in record["oracle_ids"] if doc_id not in self.index.row_of]
+                if unknown or not record["oracle_ids"]:
+                    raise ValueError(f"Question {record['question']!r} has unknown or no oracle ids: {unknown}")
+                oracle_rows.append([self.index.row_of[doc_id] for doc_id in record["oracle_ids"]])
+
+            hard = self.mine_hard_negatives([r["question"] for r in batch], oracle_rows)
+            for record, rows, hard_rows in zip(batch, oracle_rows, hard):
+                yield self.make_item(item_index, record, rows, hard_rows)
+                item_index += 1
+
+
+# --- Streaming shards from a process pool ---
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_corpus(path):
+    if path is None:
+        return RAFTSimulator.corpus.items()
+    return ((doc["id"], doc["text"]) for doc in read_jsonl(path))
+
+
+_worker_generator = None
+
+def _init_worker(corpus_path, settings):
+    # Once per process: every shard this worker writes reuses the same index
+    global _worker_generator
+    _worker_generator = RAFTGenerator(load_corpus(corpus_path), **settings)
+
+
+def _write_shard(shard_index, start_index, records, output_dir):
+    path = os.path.join(output_dir, f"raft-{shard_index:05d}.jsonl")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for item in _worker_generator.generate(records, start_index):
+            f.write(json.dumps(item) + "\n")
+    os.replace(path + ".tmp", path)  # A shard only appears once it is complete
+    return path, len(records)
+
+
+def write_dataset(records, corpus_path, output_dir, shard_size=10_000, workers=None, **settings):
+    """
+    Streams RAFT items for `records` into output_dir/raft-NNNNN.jsonl. At most
+    2 * workers shards are held in memory at once. Returns (shard paths, item count).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    records = iter(records)
+    paths, n_items, pending = [], 0, set()
+
+    def collect(done):
+        nonlocal n_items
+        for future in done:
+            path, count = future.result()
+            paths.append(path)
+            n_items += count
+            print(f"   wrote {path} ({count} items, {n_items} total)")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(corpus_path, settings)) as pool:
+        start_index = 0
+        for shard_index in itertools.count():
+            shard = list(itertools.islice(records, shard_size))
+            if not shard:
+                break
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(_write_shard, shard_index, start_index, shard, output_dir))
+            start_index += len(shard)
+        collect(wait(pending).done)
+    return sorted(paths), n_items
+
+
+def write_synthetic_inputs(n_questions, output_dir, seed=0):
+    """
+    Company fact sheets: every company has one chunk per attribute, so each question's
+    hard negatives are the same company's other facts and other companies' same fact.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    attributes = ["revenue", "CEO", "headquarters", "founding year", "main product"]
+    corpus_path = os.path.join(output_dir, "corpus.jsonl")
+    questions_path = os.path.join(output_dir, "questions.jsonl")
+    with open(corpus_path, "w", encoding="utf-8") as corpus, open(questions_path, "w", encoding="utf-8") as questions:
+        for i in range(n_questions):
+            company, attribute = f"Company{i // len(attributes)}", attributes[i % len(attributes)]
+            value = f"value{int(rng.integers(1_000_000))}"
+            corpus.write(json.dumps({"id": f"doc{i}", "text": f"{company}'s {attribute} is {value}."}) + "\n")
+            questions.write(json.dumps({"question": f"What is {company}'s {attribute}?", "oracle_ids": [f"doc{i}"], "answer": value}) + "\n")
+    return corpus_path, questions_path
+
+
+class RAFTSimulator:
+    corpus = {
+        "doc1": "AlphaCorp's revenue in 2023 was $5B.",
+        "doc2": "BetaInc's CEO is Jane Doe.",
+        "doc3": "AlphaCorp focuses on AI hardware.",
+        "doc4": "GammaLtd makes solar panels."
+    }
+
+    def __init__(self, n_distractors=2, seed=0):
+        self.generator = RAFTGenerator(self.corpus.items(), n_distractors=n_distractors, seed=seed)
+
+    def generate_dataset_item(self, question, oracle_doc_ids, item_index=0):
+        # Oracle docs + a fixed number of mined distractors, not the whole corpus
+        record = {"question": question, "oracle_ids": oracle_doc_ids}
+        return next(self.generator.generate([record], start_index=item_index))
 
     def run_demo(self):
         print("--- Generating RAFT Training Data Sample ---\n")
-        
+
         # Sample 1: AlphaCorp Revenue
         item1 = self.generate_dataset_item(
             question="What was AlphaCorp's revenue?",
             oracle_doc_ids=["doc1"]
         )
-        
+
         print("Sample 1 Structure:")
         print(json.dumps(item1, indent=2))
         print("-" * 40)
-        
+
         print("\nNote for User:")
         print("In a real RAFT workflow, you would generate thousands of these samples")
         print("and then fine-tune a Llama-3 or Mistral model specifically on this dataset.")
         print("This teaches the model to ignore the 'Distractor' docs in 'context_list'.")
+        print("Use --questions/--corpus (or --synthetic N) to stream a full dataset to JSONL shards.")
 
 if __name__ == "__main__":
-    sim = RAFTSimulator()
-    sim.run_demo()
+    parser = argparse.ArgumentParser(description="Generate a RAFT training set as JSONL shards")
+    parser.add_argument("--corpus", help="JSONL of {'id', 'text'}; defaults to the toy corpus")
+    parser.add_argument("--questions", help="JSONL of {'question', 'oracle_ids', 'answer'}")
+    parser.add_argument("--synthetic", type=int, help="Generate N synthetic questions (and their corpus) instead")
+    parser.add_argument("--output-dir", default="raft_data")
+    parser.add_argument("--shard-size", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--distractors", type=int, default=3)
+    parser.add_argument("--oracle-fraction", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not (args.questions or args.synthetic):
+        RAFTSimulator().run_demo()
+        sys.exit()
+
+    corpus_path, questions_path = args.corpus, args.questions
+    if args.synthetic:
+        corpus_path, questions_path = write_synthetic_inputs(args.synthetic, args.output_dir, seed=args.seed)
+
+    started = time.perf_counter()
+    paths, n_items = write_dataset(
+        read_jsonl(questions_path), corpus_path, args.output_dir,
+        shard_size=args.shard_size, workers=args.workers,
+        n_distractors=args.distractors, oracle_fraction=args.oracle_fraction, seed=args.seed,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"\n{n_items} items in {len(paths)} shards, {elapsed:.1f}s ({n_items / elapsed:.0f} items/s)")
@@ -15,6 +15,13 @@ Stage 2: Cross-Encoder (Reranker)
 - Output: Top-5 "Definitely" relevant docs
 """
 
+import sys
+from pathlib import Path
+
+# Per-stage spans, active only when RAG_TRACE=1 (see 06_RAG_Variations/stage_tracing.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "06_RAG_Variations"))
+from stage_tracing import span
+
 class MultiStageRAG:
     def __init__(self):
         # Mock Corpus
@@ -62,11 +69,16 @@ class MultiStageRAG:
     def run(self, query):
         print(f"--- Pipeline Start: '{query}' ---")
         
-        # 1. Retrieve
-        candidates = self.stage_1_vector_search(query)
-        
-        # 2. Rerank
-        final_top_k = self.stage_2_reranker(query, candidates)
+        with span("request", pipeline="multistage"):
+            # 1. Retrieve
+            with span("retrieve") as s:
+                candidates = self.stage_1_vector_search(query)
+                s.set(candidates=len(candidates))
+            
+            # 2. Rerank
+            with span("rerank") as s:
+                final_top_k = self.stage_2_reranker(query, candidates)
+                s.set(candidates=len(candidates), returned=len(final_top_k))
         
         print(f"\n[Final Output] Top Recommended Docs:")
         for doc in final_top_k:
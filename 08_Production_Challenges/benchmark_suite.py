@@ -0,0 +1,340 @@
+"""
+Scalable benchmark suite for the retrieval paths in this repo.
+
+Every demo runs on five or six hand-written documents, which says nothing about
+behaviour at 1M chunks. This suite generates deterministic synthetic corpora of
+any size and measures, per backend and corpus size:
+
+    index_time_s   time to build the index from scratch
+    peak_rss_mb    peak resident memory of the process (build + queries)
+    disk_mb        on-disk size of the index
+    qps, p50/p95/p99 latency of single-query search
+
+Corpus: `n_topics` topics, each with its own slice of a Zipf-distributed
+vocabulary of `vocab_size` words. A chunk mixes its topic's words with general
+vocabulary; its embedding is the topic centre plus noise. The same seed gives
+the same corpus on every machine, so results are comparable across commits.
+
+Each (backend, size) pair runs in its own subprocess, so peak RSS is measured
+cleanly and a crash or timeout in one run does not stop the suite. Everything
+runs on a plain CPU box; backends whose dependency is missing are reported as skipped.
+
+keyword and hybrid keep the BM25 postings in RAM (document texts go to a file in
+the run's workdir), about 1 KB per chunk, so 10m chunks need ~10 GB. Before a run
+starts, that estimate is checked against `--max-memory-gb` (default: the
+machine's physical RAM). If the full corpus would not fit, the run indexes the
+largest prefix that does (chunks are generated independently, so a prefix is a
+uniform sample), queries it as usual, and the result is marked `sampled` with
+its `indexed_chunks`. The other backends are disk-backed; IVF is built in blocks
+straight into its memory-mapped file, so its build peak does not grow with the
+corpus.
+
+Backends:
+    keyword     03_Advanced_RAG/bm25_index.py (sparse BM25)
+    hybrid      BM25 + exact vector search, fused with RRF (03_Advanced_RAG/score_fusion.py)
+    numpy_flat  02_Intermediate_RAG/vector_stores.py NumpyFlatVectorStore
+    ivf         02_Intermediate_RAG/ivf_index.py (nprobe=8)
+    chroma      chromadb PersistentClient (HNSW)
+
+    python benchmark_suite.py                                   # 10k and 100k, all backends
+    python benchmark_suite.py --sizes 10k 100k 1m 10m --backends keyword numpy_flat ivf
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT / "02_Intermediate_RAG"))
+sys.path.append(str(REPO_ROOT / "03_Advanced_RAG"))
+
+BACKENDS = ("keyword", "hybrid", "numpy_flat", "ivf", "chroma")
+
+# Resident bytes per chunk of the backends that keep their index in RAM
+# (peak RSS growth between 100k and 400k synthetic chunks, rounded up)
+IN_MEMORY_BYTES_PER_CHUNK = {"keyword": 1_000, "hybrid": 1_100}
+BASELINE_BYTES = 512 * 2**20  # Interpreter, NumPy and one generated block of the corpus
+
+
+# 1. Deterministic synthetic corpus
+class SyntheticCorpus:
+    def __init__(self, n_chunks, vocab_size=50_000, n_topics=200, words_per_topic=500,
+                 words_per_chunk=60, topic_share=0.7, dim=128, seed=0):
+        self.n_chunks = n_chunks
+        self.vocab_size = vocab_size
+        self.words_per_chunk = words_per_chunk
+        self.topic_share = topic_share
+        self.dim = dim
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # Zipf-like word frequencies: a few very common words, a long tail of rare ones
+        weights = 1.0 / np.arange(1, vocab_size + 1)
+        self.word_probs = weights / weights.sum()
+        self.topic_words = np.stack([rng.choice(vocab_size, size=words_per_topic, replace=False) for _ in range(n_topics)])
+        self.topic_centers = rng.normal(size=(n_topics, dim)).astype(np.float32)
+
+    def blocks(self, block_size=100_000):
+        """
+        Yields (ids, texts, topics, embeddings) for consecutive blocks of chunks.
+        Each block has its own seed, so block i is identical however it was reached.
+        """
+        for start in range(0, self.n_chunks, block_size):
+            n = min(block_size, self.n_chunks - start)
+            rng = np.random.default_rng([self.seed, start])
+            topics = rng.integers(0, len(self.topic_words), size=n)
+            from_topic = rng.random((n, self.words_per_chunk)) < self.topic_share
+            topic_picks = self.topic_words[topics[:, None], rng.integers(0, self.topic_words.shape[1], size=(n, self.words_per_chunk))]
+            general_picks = rng.choice(self.vocab_size, size=(n, self.words_per_chunk), p=self.word_probs)
+            words = np.where(from_topic, topic_picks, general_picks)
+            texts = [" ".join(f"w{w}" for w in row) for row in words]
+            embeddings = self.topic_centers[topics] + 0.8 * rng.normal(size=(n, self.dim)).astype(np.float32)
+            ids = [f"chunk_{start + i}" for i in range(n)]
+            yield ids, texts, topics, embeddings
+
+    def queries(self, n_queries, words_per_query=4):
+        # Independent of n_chunks: every corpus size is queried with the same queries
+        rng = np.random.default_rng([self.seed, 2**32 - 1])
+        topics = rng.integers(0, len(self.topic_words), size=n_queries)
+        picks = self.topic_words[topics[:, None], rng.integers(0, self.topic_words.shape[1], size=(n_queries, words_per_query))]
+        texts = [" ".join(f"w{w}" for w in row) for row in picks]
+        embeddings = self.topic_centers[topics] + 0.8 * rng.normal(size=(n_queries, self.dim)).astype(np.float32)
+        return texts, embeddings
+
+
+# 2. Backends: build(corpus, workdir) -> search(query_text, query_embedding)
+def build_keyword(corpus, workdir):
+    from bm25_index import BM25Index
+    index = BM25Index(text_path=os.path.join(workdir, "bm25_texts.bin"))  # Only postings stay in RAM
+    for ids, texts, _, _ in corpus.blocks():
+        index.add_documents(ids, texts)
+    return lambda text, embedding: index.search(text, k=10)
+
+
+def build_numpy_flat(corpus, workdir):
+    from vector_stores import NumpyFlatVectorStore
+    store = NumpyFlatVectorStore(os.path.join(workdir, "flat"))
+    for ids, _, _, embeddings in corpus.blocks():
+        store.add(ids, embeddings)
+    return lambda text, embedding: store.search(embedding, 10)
+
+
+def build_ivf(corpus, workdir, nprobe=8):
+    from ivf_index import IVFIndex
+    vectors = np.lib.format.open_memmap(
+        os.path.join(workdir, "vectors.npy"), mode="w+", dtype=np.float32, shape=(corpus.n_chunks, corpus.dim)
+    )
+    start = 0
+    for _, _, _, embeddings in corpus.blocks():
+        vectors[start:start + len(embeddings)] = embeddings
+        start += len(embeddings)
+    # Built in blocks straight into the index's memory-mapped file: no in-RAM copy of the matrix
+    index = IVFIndex.build(vectors, n_iter=10, path=os.path.join(workdir, "ivf"))
+    del vectors
+    os.remove(os.path.join(workdir, "vectors.npy"))  # The index keeps its own sorted copy
+    return lambda text, embedding: index.search(embedding, k=10, nprobe=nprobe)
+
+
+def build_hybrid(corpus, workdir):
+    from bm25_index import BM25Index
+    from score_fusion import fuse_scores
+    from vector_stores import NumpyFlatVectorStore
+    index = BM25Index(text_path=os.path.join(workdir, "bm25_texts.bin"))  # Only postings stay in RAM
+    store = NumpyFlatVectorStore(os.path.join(workdir, "flat"))
+    for ids, texts, _, embeddings in corpus.blocks():
+        index.add_documents(ids, texts)
+        store.add(ids, embeddings)  # Same insertion order, so row numbers match
+
+    def search(text, embedding):
+        keyword = index.search_batch([text], k=50)
+        vector = store.search(embedding, 50)
+        return fuse_scores([keyword, vector], [0.5, 0.5], n_rows=len(index.row_ids), k=10, method="rrf")
+    return search
+
+
+def build_chroma(corpus, workdir, batch_size=5_000):
+    import chromadb
+    client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+    collection = client.create_collection("benchmark", metadata={"hnsw:space": "cosine"})
+    for ids, texts, _, embeddings in corpus.blocks():
+        for start in range(0, len(ids), batch_size):
+            collection.add(
+                ids=ids[start:start + batch_size],
+                documents=texts[start:start + batch_size],
+                embeddings=embeddings[start:start + batch_size].tolist(),
+            )
+    return lambda text, embedding: collection.query(query_embeddings=[embedding.tolist()], n_results=10)
+
+
+BUILDERS = {
+    "keyword": build_keyword,
+    "hybrid": build_hybrid,
+    "numpy_flat": build_numpy_flat,
+    "ivf": build_ivf,
+    "chroma": build_chroma,
+}
+
+
+# 3. One measurement, run inside a child process
+def directory_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def measure(backend, n_chunks, n_queries, dim, seed, workdir):
+    corpus = SyntheticCorpus(n_chunks, dim=dim, seed=seed)
+    try:
+        started = time.perf_counter()
+        search = BUILDERS[backend](corpus, workdir)
+        index_time = time.perf_counter() - started
+    except ImportError as e:
+        return {"status": "skipped", "reason": str(e)}
+
+    texts, embeddings = corpus.queries(n_queries)
+    search(texts[0], embeddings[0])  # Warm-up: page in memory maps, lazy structures
+    latencies = []
+    started = time.perf_counter()
+    for text, embedding in zip(texts, embeddings):
+        t0 = time.perf_counter()
+        search(text, embedding)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    latency_ms = np.asarray(latencies) * 1000
+    return {
+        "status": "ok",
+        "index_time_s": index_time,
+        "peak_rss_mb": peak_rss_mb(),
+        "disk_mb": directory_size(workdir) / 2**20,
+        "qps": n_queries / elapsed,
+        "latency_ms": {p: float(np.percentile(latency_ms, int(p[1:]))) for p in ("p50", "p95", "p99")},
+    }
+
+
+def physical_memory_bytes():
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None  # Not available on this platform: no gating
+
+
+def indexable_chunks(backend, n_chunks, max_memory_bytes):
+    """
+    How many of `n_chunks` `backend` can index within the RAM budget (all of them
+    for disk-backed backends or when the budget is unknown).
+    """
+    per_chunk = IN_MEMORY_BYTES_PER_CHUNK.get(backend)
+    if not per_chunk or not max_memory_bytes:
+        return n_chunks
+    fits = int((max_memory_bytes - BASELINE_BYTES) // per_chunk)
+    return max(1, min(n_chunks, fits))
+
+
+# 4. Suite driver
+def parse_size(text):
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    text = text.lower()
+    return int(float(text[:-1]) * multipliers[text[-1]]) if text[-1] in multipliers else int(text)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, backends, n_queries=200, dim=128, seed=0, workdir=None, timeout_s=6 * 3600, max_memory_bytes=None):
+    results = []
+    for n_chunks in sizes:
+        for backend in backends:
+            # In-memory backends that would not fit index a prefix (uniform sample) of the corpus
+            n_indexed = indexable_chunks(backend, n_chunks, max_memory_bytes)
+            run_dir = tempfile.mkdtemp(prefix=f"bench_{backend}_{n_chunks}_", dir=workdir)
+            command = [
+                sys.executable, __file__, "--child", backend, "--n", str(n_indexed),
+                "--queries", str(n_queries), "--dim", str(dim), "--seed", str(seed), "--workdir", run_dir,
+            ]
+            sampled = f" (sample of {n_indexed:,})" if n_indexed < n_chunks else ""
+            print(f"{backend:<11} {n_chunks:>11,} chunks{sampled} ...", end=" ", flush=True)
+            try:
+                child = subprocess.run(command, capture_output=True, text=True, timeout=timeout_s)
+                if child.returncode == 0:
+                    result = json.loads(child.stdout.strip().splitlines()[-1])
+                else:
+                    result = {"status": "error", "reason": child.stderr.strip().splitlines()[-1:]}
+            except subprocess.TimeoutExpired:
+                result = {"status": "timeout", "reason": f"over {timeout_s}s"}
+            finally:
+                shutil.rmtree(run_dir, ignore_errors=True)
+            result.update(backend=backend, n_chunks=n_chunks, indexed_chunks=n_indexed, sampled=n_indexed < n_chunks)
+            results.append(result)
+            print(result["status"])
+    return results
+
+
+def print_results(results):
+    print(f"\n{'backend':<11} {'chunks':>11} {'index s':>9} {'RSS MB':>8} {'disk MB':>8} {'QPS':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        if r["status"] != "ok":
+            print(f"{r['backend']:<11} {r['n_chunks']:>11,} {r['status']}: {r.get('reason')}")
+            continue
+        lat = r["latency_ms"]
+        sampled = f"  sampled: {r['indexed_chunks']:,} chunks indexed" if r.get("sampled") else ""
+        print(f"{r['backend']:<11} {r['n_chunks']:>11,} {r['index_time_s']:>9.1f} {r['peak_rss_mb']:>8.0f} {r['disk_mb']:>8.1f} "
+              f"{r['qps']:>9.1f} {lat['p50']:>8.2f} {lat['p95']:>8.2f} {lat['p99']:>8.2f}{sampled}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval backends on synthetic corpora")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="Corpus sizes, e.g. 10k 100k 1m 10m")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Where indexes are built (default: system temp dir)")
+    parser.add_argument(
+        "--max-memory-gb", type=float, default=None,
+        help="RAM budget for the in-memory backends (default: physical RAM). keyword and hybrid "
+             "need ~1 KB per chunk (~10 GB at 10m); above the budget they index a sample of the corpus",
+    )
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--n", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.n, args.queries, args.dim, args.seed, args.workdir)))
+        sys.exit(0)
+
+    max_memory = args.max_memory_gb * 2**30 if args.max_memory_gb else physical_memory_bytes()
+    results = run_suite(
+        [parse_size(s) for s in args.sizes], args.backends, args.queries, args.dim, args.seed, args.workdir,
+        max_memory_bytes=max_memory,
+    )
+    print_results(results)
+    report = {
+        "git_commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "numpy": np.__version__, "cpus": os.cpu_count()},
+        "settings": {"queries": args.queries, "dim": args.dim, "seed": args.seed, "max_memory_bytes": max_memory},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")